@@ -1,84 +1,20 @@
-import copy
-import random
-from time import sleep, time
+import os
+import queue
+import threading
 import customtkinter as ctk
 from tkinter import messagebox
-import numpy as np
 from functools import partial
 
-from sudoku_solver import SudokuSolverCSP
-
-# Sudoku Solver using Backtracking Algorithm
-def solve_sudoku(board):
-    if count_non_empty(board) < 20:
-        messagebox.showerror(title="Invalid Board", message="Board must have at least 20 filled cells.")
-        return
-    solver = SudokuSolverCSP(board)
-    solver.solving = True
-    start_time = time()
-    if solver.solve():
-        steps = solver.steps_queue
-
-        end_time = time()
-        print("Time Taken: ", str((end_time - start_time)*1000) + " ms")
-        return True, steps
-    else:
-        return False, []
-
-def count_non_empty(board):
-    count = 0
-    for i in range(9):
-        for j in range(9):
-            if board[i][j] != 0:
-                count += 1
-    return count
-
-def is_valid(board, num, row, col):
-    for i in range(9):
-        if board[row][i] == num or board[i][col] == num:
-            return False
-
-    box_row = row // 3 * 3
-    box_col = col // 3 * 3
-    for i in range(box_row, box_row + 3):
-        for j in range(box_col, box_col + 3):
-            if board[i][j] == num:
-                return False
-
-    return True
-
-def is_valid_board(board):
-    def is_valid_placement(board, num, row, col):
-        # Check row
-        if num in board[row]:
-            return False
-
-        # Check column
-        if num in [board[r][col] for r in range(9)]:
-            return False
-
-        # Check 3x3 grid
-        box_row = (row // 3) * 3
-        box_col = (col // 3) * 3
-        for r in range(box_row, box_row + 3):
-            for c in range(box_col, box_col + 3):
-                if board[r][c] == num:
-                    return False
-
-        return True
-
-    # Iterate through each cell in the board
-    for row in range(9):
-        for col in range(9):
-            num = board[row][col]
-            if num != 0:  # Skip empty cells
-                # Temporarily set the cell to 0 to avoid false positives
-                board[row][col] = 0
-                if not is_valid_placement(board, num, row, col):
-                    return False
-                # Restore the number
-                board[row][col] = num
-    return True
+from sudoku_board import Board
+from sudoku_core import (MIN_FILLED, SOLVE_FAILED, SOLVE_FINISHED, SOLVE_TIMED_OUT, SOLVE_TIMEOUT, board_error,
+                         open_solution_cache, stream_solve)
+from sudoku_pool import PuzzlePool
+from sudoku_solver import CancellationToken
+from sudoku_validator import LiveValidator
+
+# Tk front end; validation, generation and solving live in sudoku_core
+
+SOLVE_POLL_MS = 20  # how often the GUI checks for steps while the worker is still searching
 
 class SudokuApp:
     def __init__(self):
@@ -90,7 +26,16 @@ class SudokuApp:
         self.app = ctk.CTk()
         self.app.title("Sudoku")
         self.app.geometry("1000x1000")
-        self.board = [[0 for _ in range(9)] for _ in range(9)]
+        self.board = Board()
+        self.step_delay = ctk.DoubleVar(value=100)  # milliseconds between animated solve steps
+        self.solve_poll = None  # pending after() id while a solve is being animated
+        self.locked_cells = []  # empty cells made read-only while a solve is being animated
+        # ready-made puzzles per difficulty, refilled in the background and kept between runs
+        self.puzzle_pool = PuzzlePool(size=5, path=os.path.join(os.path.expanduser("~"), ".sudoku_puzzle_pool.json"))
+        self.puzzle_pool.start()
+        # solutions of boards solved before, including symmetric variants of them
+        self.solution_cache = open_solution_cache(os.path.join(os.path.expanduser("~"), ".sudoku_solutions.sqlite"))
+        self.app.protocol("WM_DELETE_WINDOW", self.close)
 
         self.main_menu()
 
@@ -164,6 +109,7 @@ class SudokuApp:
         exit_button.pack(pady=10)
 
     def start_game(self):
+        self.cancel_solve()
 
         if self.game_mode.get() == "Random Board":
             self.generate_board()
@@ -177,31 +123,13 @@ class SudokuApp:
             self.handle_user_mode()
 
     def generate_board(self):
-        self.app.update()
-        self.clear_board()
-
-        self.app.update()
-
-        solver = SudokuSolverCSP(self.board)
-        solver.solve()
-        self.board = solver.puzzle
-        solved_board = copy.deepcopy(self.board)
-
-        # Remove numbers based on difficulty while ensuring a unique solution
-        difficulty_map = {"Easy": 38, "Medium": 30, "Hard": 20}
-        cells_to_remove = 81 - difficulty_map[self.difficulty.get()]
-        all_cells = [(row, col) for row in range(9) for col in range(9)]
-
-        while len(all_cells) > 81 - cells_to_remove:
-            # Randomly select an index from all_cells
-            random_index = random.randint(0, len(all_cells) - 1)
-            row, col = all_cells.pop(random_index)  # Remove and get the selected cell
-
-            self.board[row][col] = 0
-        return solved_board
+        # Unique-solution puzzle for the difficulty, taken from the pre-generated pool
+        puzzle, solution = self.puzzle_pool.pop(self.difficulty.get())
+        self.board = Board.from_grid(puzzle)
+        return Board.from_grid(solution)
 
     def clear_board(self):
-        self.board = [[0 for _ in range(9)] for _ in range(9)]
+        self.board = Board()
 
     def show_board(self, mode):
         for widget in self.app.winfo_children():
@@ -219,7 +147,7 @@ class SudokuApp:
         for i in range(9):
             row = []
             for j in range(9):
-                value = self.board[i][j]
+                value = self.board[i, j]
                 color = "black" if value != 0 else "gray"
                 entry = ctk.CTkEntry(frame, width=80, height=80, justify="center", fg_color=color, font=("Arial", 20))
                 entry.insert(0, value if value != 0 else "")
@@ -240,11 +168,15 @@ class SudokuApp:
                                               font=("Arial", 24), fg_color="red")
         self.main_menu_button.grid(row=0, column=1, padx=10)
 
+        ctk.CTkLabel(button_frame, text="Step delay", font=("Arial", 16)).grid(row=0, column=2, padx=(10, 0))
+        ctk.CTkSlider(button_frame, from_=0, to=500, variable=self.step_delay, width=150).grid(row=0, column=3, padx=10)
+
         if mode == 2:
             ctk.CTkLabel(frame, text="Input your board representation, then click Solve").grid(row=11, column=0,
                                                                                                columnspan=9, pady=10)
     def back_to_main_menu(self):
         if messagebox.askyesno(title="Main Menu", message= "Back to Main Menu?"):
+            self.cancel_solve()
             self.main_menu()
         else:
             return
@@ -252,79 +184,120 @@ class SudokuApp:
         for i in range(9):
             for j in range(9):
                 if self.cells[i][j].get().isdigit():
-                    self.board[i][j] = int(self.cells[i][j].get())
-        temp = copy.deepcopy(self.board)
-        if not is_valid_board(self.board):
-            messagebox.showerror(title="Invalid Board", message="Each number in the board cannot be repeated in a row, "
-                                                               "a column or in a 3x3 grid")
+                    self.board[i, j] = int(self.cells[i][j].get())
+        error = board_error(self.board)
+        if error is not None:
+            messagebox.showerror(title="Invalid Board", message=error)
             return
 
-        un_solved_board = copy.deepcopy(self.board)
-        solved, steps = solve_sudoku(self.board)
-        if solved:
-            self.solve_button.configure(state="disabled")
-            for i in range(9):
-                for j in range(9):
-                    if un_solved_board[i][j] != 0 and un_solved_board[i][j] != ' ':  # Only highlight solved cells
-                        self.cells[i][j].configure(fg_color="black")
-                        self.cells[i][j].configure(state="disabled")
-            for step in steps:
-                (i, j) = step[0]
-                self.cells[i][j].delete(0, "end")
-                self.cells[i][j].configure(state="normal")
-                self.cells[i][j].insert(0, step[1])
-                self.cells[i][j].configure(fg_color="green")
-                self.cells[i][j].configure(state="disabled")
-                self.app.update()
-                sleep(0.1)
+        for i in range(9):
+            for j in range(9):
+                if self.board[i, j] != 0:  # Only highlight solved cells
+                    self.cells[i][j].configure(fg_color="black")
+                    self.cells[i][j].configure(state="disabled")
+        # typing into an empty cell would change the board under the animation
+        self.locked_cells = [cell for row in self.cells for cell in row if cell.cget("state") == "normal"]
+        for cell in self.locked_cells:
+            cell.configure(state="disabled")
+
+        # solve in a worker thread and animate its steps from the Tk event loop
+        self.solve_steps = queue.Queue()
+        self.solve_cancelled = CancellationToken()
+        threading.Thread(
+            target=stream_solve, args=(self.board.copy(), self.solve_steps, self.solve_cancelled, "csp",
+                                       self.solution_cache), daemon=True
+        ).start()
+        self.solve_button.configure(text="Stop", command=self.cancel_solve)
+        self.solve_poll = self.app.after(0, self.show_next_step)
+
+    # shows one step per tick, at the speed chosen on the slider
+    def show_next_step(self):
+        try:
+            step = self.solve_steps.get_nowait()
+        except queue.Empty:
+            self.solve_poll = self.app.after(SOLVE_POLL_MS, self.show_next_step)
+            return
 
+        if step is SOLVE_FINISHED or step is SOLVE_FAILED or step is SOLVE_TIMED_OUT:
+            self.solve_poll = None
+            self.unlock_cells()
             self.solve_button.configure(text="New Game", command=self.start_game, state="normal")
-        else:
-            messagebox.showerror("Error", "No solution exists for the provided board.")
+            if step is SOLVE_FAILED:
+                messagebox.showerror("Error", "No solution exists for the provided board.")
+            elif step is SOLVE_TIMED_OUT:
+                messagebox.showerror("Error", f"No solution found within {SOLVE_TIMEOUT} seconds.")
+            return
+
+        (i, j), value = step
+        self.board[i, j] = value
+        self.cells[i][j].configure(state="normal")
+        self.cells[i][j].delete(0, "end")
+        self.cells[i][j].insert(0, value)
+        self.cells[i][j].configure(fg_color="green")
+        self.cells[i][j].configure(state="disabled")
+        self.solve_poll = self.app.after(int(self.step_delay.get()), self.show_next_step)
+
+    # stops the worker and the animation, leaving the steps shown so far on the board
+    def cancel_solve(self):
+        if self.solve_poll is None:
+            return
+        self.solve_cancelled.cancel()
+        self.app.after_cancel(self.solve_poll)
+        self.solve_poll = None
+        self.unlock_cells()
+        if self.solve_button.winfo_exists():
+            self.solve_button.configure(text="New Game", command=self.start_game, state="normal")
+
+    # makes the cells locked by solve_gui() that the solve left empty editable again
+    def unlock_cells(self):
+        for cell in self.locked_cells:
+            if cell.winfo_exists() and not cell.get():
+                cell.configure(state="normal")
+        self.locked_cells = []
 
     def handle_user_input_mode(self):
 
         self.solve_button.configure(state="disabled")
+        validator = LiveValidator(self.board)  # row/column/box occupancy of the board typed so far
         def validate_input(event, row, col):
 
             cell = event.widget
 
             value = cell.get()
 
-            temp_board = copy.deepcopy(self.board)
-            solver = SudokuSolverCSP(temp_board)
-
             if not value.isdigit():
                 self.cells[row][col].delete(0, "end")
-                self.board[row][col] = 0
+                self.board[row, col] = 0
+                validator.clear(row, col)
                 if value == '':
-                    solver.domains[(row, col)] = {1, 2, 3, 4, 5, 6, 7, 8, 9}
                     self.cells[row][col].configure(fg_color="grey")
-                    self.board[row][col] = 0
-                    if count_non_empty(self.board) < 20:
-                        self.solve_button.configure(state="disabled")
+                if validator.filled < MIN_FILLED:
+                    self.solve_button.configure(state="disabled")
                 return
 
             if not 1 <= int(value) <= 9:
                 self.cells[row][col].delete(0, "end")
-                self.board[row][col] = 0
+                self.board[row, col] = 0
+                validator.clear(row, col)
+                if validator.filled < MIN_FILLED:
+                    self.solve_button.configure(state="disabled")
                 return
 
-            old_domains = copy.deepcopy(solver.domains)
-            solver.domains[(row, col)] = {int(value)}
-            if solver.apply_arc_consistency():
-                self.board[row][col] = int(value)
+            if not validator.place(row, col, int(value)):
+                self.board[row, col] = int(value)
                 self.cells[row][col].configure(fg_color="grey")
-                if count_non_empty(self.board) >= 20:
+                if validator.filled >= MIN_FILLED:
                     self.solve_button.configure(state="normal")
 
             else:
-                solver.domains = old_domains
+                validator.clear(row, col)
+                self.board[row, col] = 0
                 self.cells[row][col].configure(state="normal", fg_color="red")
                 messagebox.showerror(title="Invalid Board", message="The provided board is inconsistent.")
                 self.cells[row][col].configure(state="normal", fg_color="grey")
                 self.cells[row][col].delete(0, "end")
-                self.solve_button.configure(state="disabled")
+                if validator.filled < MIN_FILLED:
+                    self.solve_button.configure(state="disabled")
         for i in range(9):
             for j in range(9):
                     self.cells[i][j].bind("<KeyRelease>", partial(validate_input,row=i, col=j))
@@ -343,25 +316,25 @@ class SudokuApp:
             if not value.isdigit():
                 self.cells[row][col].delete(0, "end")
                 self.cells[row][col].configure(fg_color="gray")
-                self.board[row][col] = 0
+                self.board[row, col] = 0
                 return
             if value == '':
                 self.cells[row][col].configure(fg_color="gray")
-                self.board[row][col] = 0
+                self.board[row, col] = 0
                 return
 
             if not 1 <= int(value) <= 9:
                 self.cells[row][col].configure(fg_color="red")
-                self.board[row][col] = 0
+                self.board[row, col] = 0
                 return
 
             num = int(value)
-            self.board[row][col] = num  # Temporarily update the board for validation
+            self.board[row, col] = num  # Temporarily update the board for validation
 
             # Validate current move
-            if num != solved_board[row][col]:
+            if num != solved_board[row, col]:
                 self.cells[row][col].configure(fg_color="red")
-                self.board[row][col] = 0  # Reset the cell in the board
+                self.board[row, col] = 0  # Reset the cell in the board
 
             else:
                 self.cells[row][col].configure(fg_color="green")
@@ -383,10 +356,19 @@ class SudokuApp:
 
     def exit(self):
         if messagebox.askyesno(title="Exit Game", message="Are you sure you want to exit?"):
-            exit()
+            self.close()
         else:
             return
 
+    def close(self):
+        self.puzzle_pool.stop()
+        try:
+            self.puzzle_pool.save()
+        except OSError:
+            pass  # the pool is only a cache, losing it just means generating again next run
+        self.solution_cache.close()
+        exit()
+
 if __name__ == "__main__":
     app = SudokuApp()
     app.run()
@@ -0,0 +1,329 @@
+import json
+import os
+import random
+import sys
+from itertools import islice
+from math import isqrt
+from time import perf_counter, perf_counter_ns
+
+from sudoku_packed import PackedChunk, PackedCorpus, PackedWriter, is_packed
+from sudoku_solver import STRATEGIES, Budget, SolverStats, generate_puzzle, make_solver
+
+
+DIGITS = "123456789ABCDEFGHIJKLMNOP"  # cell values 1-25, so grids up to 25x25 fit one char per cell
+GRID_SIZES = (9, 16, 25)
+
+
+# "4.....8.5.3..." or "400000805030..." -> 9x9 grid with 0 for empty cells; 256 and 625
+# character lines are 16x16 and 25x25 grids using the letters of DIGITS above 9
+def parse_puzzle(text):
+    n = isqrt(len(text))
+    if n not in GRID_SIZES or n * n != len(text):
+        raise ValueError(f"expected 81, 256 or 625 cells, got {len(text)}")
+    digits = DIGITS[:n]
+    cells = []
+    for ch in text:
+        if ch in ".0":
+            cells.append(0)
+        elif ch.upper() in digits:
+            cells.append(digits.index(ch.upper()) + 1)
+        else:
+            raise ValueError(f"invalid cell {ch!r} for a {n}x{n} puzzle")
+    return [cells[r * n:r * n + n] for r in range(n)]
+
+
+def format_puzzle(grid):
+    return "".join(DIGITS[value - 1] if value else "." for row in grid for value in row)
+
+
+# (line number, puzzle text) for every non-empty, non-comment line; only the first
+# whitespace-separated field is used so rated corpora ("<puzzle> <rating>") work too
+def read_puzzles(lines):
+    for line_no, line in enumerate(lines, 1):
+        fields = line.split()
+        if fields and not fields[0].startswith("#"):
+            yield line_no, fields[0]
+
+
+# SolutionCache per path in this process, shared by every chunk it solves
+CACHES = {}
+
+
+def open_cache(path):
+    cache = CACHES.get(path)
+    if cache is None:
+        from sudoku_cache import SolutionCache
+
+        cache = CACHES[path] = SolutionCache(path=path)
+    return cache
+
+
+# `budget` (a Budget without a cancellation token) limits each puzzle's solve on its own. The
+# numpy engine takes no cache: a cache lookup costs more than propagating the puzzle does there.
+def solve_chunk(chunk, engine="csp", strategy="csp", cache_path=None, budget=None):
+    if engine == "numpy":
+        if cache_path is not None:
+            raise ValueError("the numpy engine does not use a solution cache")
+        return solve_chunk_vectorized(chunk, strategy, budget)
+    cache = None if cache_path is None else open_cache(cache_path)
+    results = []
+    for line_no, text in chunk:
+        try:
+            grid = parse_puzzle(text)
+        except ValueError as error:
+            results.append({"line": line_no, "puzzle": text, "error": str(error)})
+            continue
+        solver = make_solver(grid, strategy, cache, budget)
+        stats = solver.solve()
+        result = {
+            "line": line_no,
+            "puzzle": text,
+            "solution": format_puzzle(solver.puzzle) if stats else None,
+            "status": stats.status,
+            "stats": stats.as_dict(),
+        }
+        if stats.budget_exceeded:
+            result["reached"] = format_puzzle(solver.current_grid())  # values fixed when it gave up
+        results.append(result)
+    return results
+
+
+# Propagates the 9x9 puzzles of the chunk at once with sudoku_numpy; puzzles solved by
+# propagation alone get an equal share of the vectorised propagation time as theirs. Larger grids,
+# which the vectorised code does not handle, and invalid lines go through solve_chunk().
+def solve_chunk_vectorized(chunk, strategy="csp", budget=None):
+    import sudoku_numpy
+
+    results = []
+    if isinstance(chunk, PackedChunk):
+        # already validated 9x9 cell values, decoded straight from the mapped file
+        valid = list(chunk)
+        grids = chunk.digits()
+    else:
+        valid = []
+        scalar = []  # 16x16 and 25x25 puzzles, and lines to be reported as invalid
+        for line_no, text in chunk:
+            if len(text) == 81 and set(text) <= set(".0123456789"):
+                valid.append((line_no, text))
+            else:
+                scalar.append((line_no, text))
+        results = solve_chunk(scalar, "csp", strategy, budget=budget)
+        if not valid:
+            return results
+        grids = sudoku_numpy.parse_puzzles([text for _, text in valid])
+
+    start = perf_counter_ns()
+    solutions, status = sudoku_numpy.propagate_batch(grids)
+    share = (perf_counter_ns() - start) // len(valid)
+    # timed apart from the propagation: these puzzles report the stats of their own solve
+    fallback_stats = sudoku_numpy.solve_ambiguous(solutions, status, strategy, budget)
+    # every solution as text in one conversion, then a slice per puzzle
+    solution_text = (solutions + ord("0")).astype("uint8").tobytes().decode("ascii")
+    solved = solutions.any(axis=1).tolist()
+
+    for index, (line_no, text) in enumerate(valid):
+        stats = fallback_stats.get(index)
+        if stats is None:
+            stats = SolverStats()
+            stats.solved = int(status[index] == sudoku_numpy.SOLVED)
+            stats.propagation_ns = share
+        results.append({
+            "line": line_no,
+            "puzzle": text,
+            "solution": solution_text[index * 81:index * 81 + 81] if solved[index] else None,
+            "status": stats.status,
+            "stats": stats.as_dict(),
+        })
+    return results
+
+
+def chunked(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Solves chunks in worker processes, keeping only a bounded number of chunks in flight so
+# memory stays flat however long the input is. Results come back in completion order. `puzzles`
+# is either (line number, text) pairs or a PackedCorpus, whose chunks are only record ranges
+# until a worker reads them.
+def solve_stream(puzzles, workers=None, chunk_size=64, engine="csp", strategy="csp", cache_path=None,
+                 budget=None):
+    if isinstance(puzzles, PackedCorpus):
+        chunks = puzzles.chunks(chunk_size)
+    else:
+        chunks = chunked(puzzles, chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            yield from solve_chunk(chunk, engine, strategy, cache_path, budget)
+        return
+
+    # imported here so in-process solving and the worker processes themselves start faster
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(solve_chunk, chunk, engine, strategy, cache_path, budget))
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        for future in pending:
+            yield from future.result()
+
+
+def write_result(result, output, output_format):
+    if output_format == "jsonl":
+        output.write(json.dumps(result))
+    elif "error" in result:
+        output.write(f"{result['line']}\terror\t{result['error']}")
+    else:
+        stats = result["stats"]
+        output.write(f"{result['line']}\t{result['solution'] or result.get('status', 'unsolvable')}\t"
+                     f"{stats['nodes']}\t{(stats['propagation_ns'] + stats['search_ns']) / 1e6:.3f}")
+    output.write("\n")
+
+
+def solve_command(args):
+    if args.puzzles != "-" and is_packed(args.puzzles):
+        source = PackedCorpus(args.puzzles)
+    else:
+        source = sys.stdin if args.puzzles == "-" else open(args.puzzles, encoding="utf-8")
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    total = SolverStats()
+    total.solves = 0
+    errors = 0
+    start = perf_counter()
+    try:
+        budget = None
+        if args.max_nodes is not None or args.timeout is not None or args.max_propagations is not None:
+            budget = Budget(args.max_nodes, args.timeout, args.max_propagations)
+        puzzles = source if isinstance(source, PackedCorpus) else read_puzzles(source)
+        for result in solve_stream(puzzles, args.workers, args.chunk_size, args.engine, args.strategy,
+                                   args.cache, budget):
+            write_result(result, output, args.format)
+            if "error" in result:
+                errors += 1
+            else:
+                total = total + SolverStats.from_dict(result["stats"])
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = perf_counter() - start
+    print(f"{total.solves} puzzles, {total.solved} solved, {total.budget_exceeded} over budget, "
+          f"{errors} invalid in {elapsed:.2f} s "
+          f"({total.solves / elapsed if elapsed else 0:.0f} puzzles/s), "
+          f"{total.nodes} search nodes, {total.backtracks} backtracks, {total.cache_hits} cache hits", file=sys.stderr)
+    return 0
+
+
+# Writes `count` unique-solution puzzles, one per line. With --seed the output is reproducible,
+# which is how the corpora/ files were made.
+def generate_command(args):
+    if args.seed is not None:
+        random.seed(args.seed)
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        for _ in range(args.count):
+            puzzle, _ = generate_puzzle(args.clues, args.box_size)
+            output.write(format_puzzle(puzzle) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+# Converts a text corpus to the packed format of sudoku_packed. With --solutions, a second
+# field that is a whole 81-character grid is stored as the puzzle's solution.
+def pack_command(args):
+    source = sys.stdin if args.puzzles == "-" else open(args.puzzles, encoding="utf-8")
+    skipped = 0
+    try:
+        with PackedWriter(args.output, solutions=args.solutions) as writer:
+            for line_no, line in enumerate(source, 1):
+                fields = line.split()
+                if not fields or fields[0].startswith("#"):
+                    continue
+                solution = fields[1] if len(fields) > 1 and len(fields[1]) == 81 else None
+                try:
+                    writer.write(fields[0], solution)
+                except ValueError as error:
+                    print(f"line {line_no}: {error}", file=sys.stderr)
+                    skipped += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    print(f"{writer.count} puzzles packed, {skipped} skipped", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m sudoku_solver", description="Headless Sudoku solving")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    solve = commands.add_parser("solve", help="solve a file of puzzles, one per line (81, 256 or 625 characters)")
+    solve.add_argument("puzzles", help="puzzle file (text, or packed with the pack command), or - for stdin")
+    solve.add_argument("-o", "--output", default="-", help="where to write results (default: stdout)")
+    solve.add_argument("-j", "--workers", type=int, default=None,
+                       help="worker processes (default: one per CPU, 1 solves in-process)")
+    solve.add_argument("--chunk-size", type=int, default=64, help="puzzles sent to a worker at a time")
+    solve.add_argument("--engine", choices=("csp", "numpy"), default="csp",
+                       help="numpy propagates each chunk as one vectorised batch (requires numpy) and only "
+                            "backtracks the puzzles left ambiguous; use a large --chunk-size with it")
+    solve.add_argument("--strategy", choices=STRATEGIES, default="csp",
+                       help="csp: AC-3 and inference with MRV backtracking; dlx: Dancing Links exact cover "
+                            "(with --engine numpy, the solver for puzzles propagation leaves ambiguous)")
+    solve.add_argument("--max-nodes", type=int, default=None, help="give up on a puzzle after this many search nodes")
+    solve.add_argument("--timeout", type=float, default=None, help="give up on a puzzle after this many seconds")
+    solve.add_argument("--max-propagations", type=int, default=None,
+                       help="give up on a puzzle after this many propagation passes")
+    solve.add_argument("--cache", metavar="PATH", default=None,
+                       help="SQLite file of solutions to reuse for repeated and symmetric puzzles, and to add to "
+                            "(not with --engine numpy)")
+    solve.add_argument("--format", choices=("jsonl", "text"), default="jsonl",
+                       help="jsonl: one JSON object per puzzle with its stats; "
+                            "text: line, solution, search nodes and milliseconds separated by tabs")
+    solve.set_defaults(handler=solve_command)
+
+    generate = commands.add_parser("generate", help="write random puzzles with a unique solution, one per line")
+    generate.add_argument("-n", "--count", type=int, default=10, help="number of puzzles")
+    generate.add_argument("--clues", type=int, default=30,
+                          help="givens to aim for; clues are removed only while the solution stays unique")
+    generate.add_argument("--box-size", type=int, choices=(3, 4, 5), default=3,
+                          help="3 for 9x9, 4 for 16x16, 5 for 25x25 puzzles")
+    generate.add_argument("--seed", type=int, default=None, help="random seed for a reproducible corpus")
+    generate.add_argument("-o", "--output", default="-", help="where to write the puzzles (default: stdout)")
+    generate.set_defaults(handler=generate_command)
+
+    pack = commands.add_parser("pack", help="convert a file of 81-character puzzles to the packed binary format")
+    pack.add_argument("puzzles", help="puzzle file, or - for stdin")
+    pack.add_argument("-o", "--output", required=True, help="packed corpus to write")
+    pack.add_argument("--solutions", action="store_true",
+                      help="also store each puzzle's solution, given as a second 81-character field")
+    pack.set_defaults(handler=pack_command)
+
+    # imported here, sudoku_bench itself imports this module
+    import sudoku_bench
+    bench = commands.add_parser("bench", help="benchmark a solver over the bundled corpora (see sudoku_bench)")
+    sudoku_bench.add_arguments(bench)
+
+    args = parser.parse_args(argv)
+    if args.command == "solve" and args.engine == "numpy" and args.cache is not None:
+        parser.error("--cache cannot be used with --engine numpy")
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
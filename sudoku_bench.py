@@ -0,0 +1,243 @@
+import argparse
+import glob
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tracemalloc
+from collections import Counter
+from time import perf_counter_ns
+
+from sudoku_batch import parse_puzzle, read_puzzles
+from sudoku_packed import PackedCorpus, is_packed
+from sudoku_solver import STRATEGIES, Budget, make_solver
+
+# Benchmark of a solver over the puzzle corpora bundled in corpora/ (easy, hard, 17-clue,
+# pathological, invalid, 16x16 and 25x25). Every corpus gets its latency percentiles,
+# throughput, search nodes and peak traced memory, and the cold start of the entry-point modules
+# is timed in fresh interpreters; results can be saved as a JSON baseline and later runs compared
+# against it, failing when a metric got worse by more than a threshold.
+
+CORPORA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpora")
+# modules whose import time in a fresh interpreter is reported as their cold start
+COLD_START_MODULES = ("sudoku_core", "sudoku_batch")
+# per-corpus result counts, which must match the baseline exactly
+STATUS_COUNTS = ("puzzles", "invalid", "solved", "unsolvable", "budget_exceeded")
+# metrics compared against a baseline, and whether a larger value is worse
+COMPARED = {"p50_ms": True, "p95_ms": True, "p99_ms": True, "throughput": False, "nodes": True, "peak_kib": True}
+
+
+# nearest-rank percentile of an ascending list
+def percentile(values, fraction):
+    if not values:
+        return 0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+# puzzle texts of a corpus file, text or packed (see sudoku_packed)
+def load_corpus(path):
+    if is_packed(path):
+        with PackedCorpus(path) as corpus:
+            return [text for _, text in corpus]
+    with open(path, encoding="utf-8") as lines:
+        return [text for _, text in read_puzzles(lines)]
+
+
+# Solves every valid puzzle of a corpus `repeat` times, keeping its fastest time, then, with
+# `memory`, once more under tracemalloc for the peak memory of a single solve (tracing slows the
+# solver down several times over, so it is kept out of the timed runs). The random module is
+# reseeded before every solve so node counts are the same from run to run.
+def run_corpus(puzzles, strategy="csp", budget=None, repeat=3, seed=0, memory=True):
+    grids = []
+    invalid = 0
+    for text in puzzles:
+        try:
+            grids.append(parse_puzzle(text))
+        except ValueError:
+            invalid += 1
+
+    latencies = []
+    statuses = Counter()
+    nodes = 0
+    for grid in grids:
+        fastest = None
+        for _ in range(repeat):
+            random.seed(seed)
+            solver = make_solver([row[:] for row in grid], strategy, budget=budget)
+            start = perf_counter_ns()
+            stats = solver.solve()
+            elapsed = perf_counter_ns() - start
+            fastest = elapsed if fastest is None else min(fastest, elapsed)
+        latencies.append(fastest)
+        statuses[stats.status] += 1
+        nodes += stats.nodes
+
+    latencies.sort()
+    result = {
+        "puzzles": len(grids),
+        "invalid": invalid,
+        "solved": statuses["solved"],
+        "unsolvable": statuses["unsolvable"],
+        "budget_exceeded": statuses["budget exceeded"],
+        "p50_ms": percentile(latencies, 0.50) / 1e6,
+        "p95_ms": percentile(latencies, 0.95) / 1e6,
+        "p99_ms": percentile(latencies, 0.99) / 1e6,
+        "max_ms": (latencies[-1] if latencies else 0) / 1e6,
+        "throughput": len(latencies) * 1e9 / sum(latencies) if latencies else 0,
+        "nodes": nodes,
+    }
+    if memory:
+        tracemalloc.start()
+        peak = 0
+        for grid in grids:
+            random.seed(seed)
+            solver = make_solver([row[:] for row in grid], strategy, budget=budget)
+            tracemalloc.reset_peak()
+            solver.solve()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            del solver
+        tracemalloc.stop()
+        result["peak_kib"] = peak / 1024
+    return result
+
+
+# wall milliseconds a fresh interpreter takes to run `code`, fastest of `repeat` runs
+def interpreter_ms(code, repeat):
+    fastest = None
+    for _ in range(repeat):
+        start = perf_counter_ns()
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed = perf_counter_ns() - start
+        fastest = elapsed if fastest is None else min(fastest, elapsed)
+    return fastest / 1e6
+
+
+# milliseconds each module adds to the start of a fresh interpreter, and the interpreter's own
+# start-up time (under "python")
+def cold_start(modules=COLD_START_MODULES, repeat=5):
+    python = interpreter_ms("pass", repeat)
+    times = {module: max(0.0, interpreter_ms(f"import {module}", repeat) - python) for module in modules}
+    times["python"] = python
+    return times
+
+
+def print_results(results, output):
+    output.write(f"{'corpus':<16}{'puzzles':>8}{'solved':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+                 f"{'puzzles/s':>11}{'nodes':>9}{'peak KiB':>10}\n")
+    for name, row in results["corpora"].items():
+        output.write(f"{name:<16}{row['puzzles']:>8}{row['solved']:>8}{row['p50_ms']:>10.3f}{row['p95_ms']:>10.3f}"
+                     f"{row['p99_ms']:>10.3f}{row['throughput']:>11.1f}{row['nodes']:>9}"
+                     f"{'-' if 'peak_kib' not in row else format(row['peak_kib'], '.1f'):>10}\n")
+    times = results["cold_start_ms"]
+    output.write("cold start: " + ", ".join(f"{module} {ms:.1f} ms" for module, ms in times.items()
+                                          if module != "python")
+                 + f" (interpreter {times['python']:.1f} ms)\n")
+
+
+# Rows (corpus, metric, baseline value, current value, change, failed) comparing a run with a
+# baseline, for every metric both have for the same corpus. With max_regression, a status count
+# that changed fails (a puzzle changing outcome is a bug, not a slowdown), and another metric
+# fails when it is more than max_regression percent worse or, from a baseline of 0, when it got
+# worse at all. Cold start is too noisy for a percentage and is compared in milliseconds, failing
+# only when max_cold_start is given and it grew by more than that many.
+def compare(results, baseline, max_regression=None, max_cold_start=None):
+    gate = max_regression is not None
+    rows = []
+    for name, row in results["corpora"].items():
+        previous = baseline["corpora"].get(name)
+        if previous is None:
+            continue
+        for metric in STATUS_COUNTS:
+            old, new = previous.get(metric), row.get(metric)
+            if old is not None and new is not None:
+                rows.append((name, metric, old, new, "changed" if new != old else "same", gate and new != old))
+        for metric, larger_is_worse in COMPARED.items():
+            old, new = previous.get(metric), row.get(metric)
+            if old is None or new is None:
+                continue
+            worse = new - old if larger_is_worse else old - new
+            if old:
+                percent = worse / old * 100
+                rows.append((name, metric, old, new, f"{percent:+.1f}% worse", gate and percent > max_regression))
+            else:
+                rows.append((name, metric, old, new, f"{worse:+g} worse", gate and worse > 0))
+    previous = baseline.get("cold_start_ms", {})
+    for module in COLD_START_MODULES:
+        old, new = previous.get(module), results["cold_start_ms"].get(module)
+        if old is not None and new is not None:
+            rows.append(("cold start", module, old, new, f"{new - old:+.1f} ms",
+                         max_cold_start is not None and new - old > max_cold_start))
+    return rows
+
+
+def bench_command(args):
+    paths = args.corpora or sorted(glob.glob(os.path.join(CORPORA_DIR, "*.txt"))
+                                   + glob.glob(os.path.join(CORPORA_DIR, "*.sdkp")))
+    budget = Budget(args.max_nodes, args.timeout)
+    results = {
+        "strategy": args.strategy,
+        "max_nodes": args.max_nodes,
+        "timeout": args.timeout,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cold_start_ms": cold_start(),
+        "corpora": {},
+    }
+    for path in paths:
+        name, extension = os.path.splitext(os.path.basename(path))
+        if extension != ".txt":
+            name += extension
+        results["corpora"][name] = run_corpus(load_corpus(path), args.strategy, budget, args.repeat, args.seed,
+                                              args.memory)
+    print_results(results, sys.stdout)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as source:
+            baseline = json.load(source)
+        print(f"\ncompared with {args.baseline}:")
+        for name, metric, old, new, change, failed in compare(results, baseline, args.max_regression, args.max_cold_start):
+            regressions += failed
+            print(f"{name:<16}{metric:<16}{old:>12.6g} -> {new:<12.6g}{change:>14}{'  REGRESSION' if failed else ''}")
+        if regressions:
+            print(f"{regressions} metrics regressed past --max-regression or --max-cold-start", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def add_arguments(parser):
+    parser.add_argument("corpora", nargs="*", help="puzzle files, text or packed, to run (default: every corpora/*.txt and *.sdkp)")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="csp", help="solver to benchmark")
+    parser.add_argument("--max-nodes", type=int, default=5000,
+                        help="search nodes before a puzzle counts as over budget (default: 5000)")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds before a puzzle counts as over budget")
+    parser.add_argument("--repeat", type=int, default=3, help="timed solves per puzzle, the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0, help="random seed set before every solve")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip the tracemalloc pass that measures peak memory (the slowest part of a run)")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a JSON baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="JSON baseline from --save to compare with")
+    parser.add_argument("--max-regression", type=float, metavar="PCT", default=None,
+                        help="with --baseline, exit with status 1 when a status count changed or a metric is "
+                             "more than PCT%% worse (any increase over a baseline of 0)")
+    parser.add_argument("--max-cold-start", type=float, metavar="MS", default=None,
+                        help="with --baseline, exit with status 1 when a module's cold start grew by more than MS "
+                             "milliseconds (not checked by default, it varies a lot between runs)")
+    parser.set_defaults(handler=bench_command)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python sudoku_bench.py", description="Benchmark the Sudoku solvers")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+from sudoku_solver import SudokuSolverCSP, get_topology, grid_box_size, mask_value, value_bit
+
+
+# An n x n board (9x9 unless another box size is given) in flat storage (cell (r, c) at index
+# r * n + c, 0 for empty) that keeps the digits present in every row, column and box as bitmasks,
+# the number of filled cells and the number of repeated digits up to date as cells change, so
+# every occupancy, count and validity check is O(1). Index it with board[r, c].
+class Board:
+    __slots__ = ("topology", "cells", "row_masks", "column_masks", "box_masks", "unit_counts", "filled", "repeats")
+
+    def __init__(self, cells=None, box_size=3):
+        self.topology = get_topology(box_size)
+        n = self.topology.size
+        self.cells = [0] * (n * n)
+        self.row_masks = [0] * n
+        self.column_masks = [0] * n
+        self.box_masks = [0] * n
+        # digit counts per unit, n + 1 slots per unit: rows first, then columns, then boxes
+        self.unit_counts = [0] * (3 * n * (n + 1))
+        self.filled = 0
+        self.repeats = 0  # extra copies of digits within a unit, 0 for a valid board
+        if cells is not None:
+            for var, value in enumerate(cells):
+                if value:
+                    self[divmod(var, n)] = value
+
+    @classmethod
+    def from_grid(cls, grid):
+        return cls([value for row in grid for value in row], grid_box_size(grid))
+
+    # the singleton domains of a solver, e.g. after solve()
+    @classmethod
+    def from_solver(cls, solver):
+        bit_count = solver.topology.bit_count
+        return cls([mask_value(domain) if bit_count[domain] == 1 else 0 for domain in solver.domains],
+                   solver.topology.box_size)
+
+    @property
+    def size(self):
+        return self.topology.size
+
+    def to_grid(self):
+        n = self.topology.size
+        return [self.cells[r * n:r * n + n] for r in range(n)]
+
+    def to_solver(self, **options):
+        return SudokuSolverCSP(self.to_grid(), **options)
+
+    def copy(self):
+        board = Board.__new__(Board)
+        board.topology = self.topology
+        board.cells = self.cells[:]
+        board.row_masks = self.row_masks[:]
+        board.column_masks = self.column_masks[:]
+        board.box_masks = self.box_masks[:]
+        board.unit_counts = self.unit_counts[:]
+        board.filled = self.filled
+        board.repeats = self.repeats
+        return board
+
+    def __getitem__(self, position):
+        r, c = position
+        return self.cells[r * self.topology.size + c]
+
+    def __setitem__(self, position, value):
+        r, c = position
+        var = r * self.topology.size + c
+        old = self.cells[var]
+        if old == value:
+            return
+        b = self.box(r, c)
+        if old:
+            self.update_units(r, c, b, old, -1)
+            self.filled -= 1
+        self.cells[var] = value
+        if value:
+            self.update_units(r, c, b, value, 1)
+            self.filled += 1
+
+    def update_units(self, r, c, b, value, delta):
+        bit = value_bit(value)
+        n = self.topology.size
+        stride = n + 1
+        for masks, index, base in ((self.row_masks, r, 0), (self.column_masks, c, n * stride),
+                                   (self.box_masks, b, 2 * n * stride)):
+            slot = base + index * stride + value
+            count = self.unit_counts[slot]
+            self.unit_counts[slot] = count + delta
+            if delta > 0:
+                masks[index] |= bit
+                if count:
+                    self.repeats += 1
+            else:
+                if count > 1:
+                    self.repeats -= 1
+                else:
+                    masks[index] &= ~bit
+
+    def __eq__(self, other):
+        return isinstance(other, Board) and self.cells == other.cells
+
+    # index of the box holding cell (r, c)
+    def box(self, r, c):
+        box_size = self.topology.box_size
+        return (r // box_size) * box_size + c // box_size
+
+    # digits used by the row, column and box of a cell
+    def used(self, r, c):
+        return self.row_masks[r] | self.column_masks[c] | self.box_masks[self.box(r, c)]
+
+    # bitmask of the values an empty cell can still take
+    def candidates(self, r, c):
+        return self.topology.all_values & ~self.used(r, c)
+
+    # whether `value` can go at (r, c) without repeating a digit; the cell's own value is ignored
+    def can_place(self, r, c, value):
+        n = self.topology.size
+        stride = n + 1
+        if self.cells[r * n + c] == value:
+            return self.unit_counts[r * stride + value] == 1 \
+                and self.unit_counts[(n + c) * stride + value] == 1 \
+                and self.unit_counts[(2 * n + self.box(r, c)) * stride + value] == 1
+        return not self.used(r, c) & value_bit(value)
+
+    def is_valid(self):
+        return self.repeats == 0
+
+    def is_solved(self):
+        return self.filled == len(self.cells) and self.repeats == 0
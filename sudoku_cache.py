@@ -0,0 +1,221 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from itertools import permutations
+
+# Solutions of puzzles seen before, looked up by exact grid and, for 9x9 grids, by canonical form,
+# so a puzzle that only differs from a cached one by Sudoku symmetries is answered without solving.
+#
+# The symmetries used are transposition, reordering the rows inside each band, reordering the
+# columns inside each stack and relabelling the digits. The canonical form is the lexicographically
+# smallest grid reachable with them, with digits relabelled 1, 2, ... in reading order; it is built
+# a row at a time, keeping every partial transform that ties for the smallest rows so far.
+
+BOX = 3
+SIZE = BOX * BOX
+# orders of the columns of each stack; a column order keeps every column inside its stack, so it
+# is one of these per stack (216 in all for a 9x9 grid)
+STACK_ORDERS = tuple(tuple(permutations(range(s * BOX, s * BOX + BOX))) for s in range(BOX))
+MAX_TIES = 4096  # partial transforms kept per row; sparser grids are only cached by exact key
+
+
+def grid_key(grid):
+    return bytes(value for row in grid for value in row)
+
+
+# row of a grid read through a column order, with digits relabelled; `labels` (source digit ->
+# canonical digit) is extended with the digits seen for the first time
+def relabel_row(row, order, labels):
+    out = []
+    for c in order:
+        value = row[c]
+        if value:
+            label = labels.get(value)
+            if label is None:
+                label = labels[value] = len(labels) + 1
+            value = label
+        out.append(value)
+    return tuple(out)
+
+
+# Canonical form of a 9x9 grid as (key, transform), or (None, None) when too many partial
+# transforms tie (nearly empty grids). A transform is (transposed, source row of each canonical
+# row, source column of each canonical column, digit labels).
+def canonical_form(grid):
+    # first row: a row of the first band in either orientation, with its columns ordered a stack
+    # at a time; a smaller prefix is smaller whatever follows, so only the orders tying for the
+    # smallest prefix so far are extended to the next stack
+    states = []  # (transposed rows, source rows so far, column order, labels, transposed) tying for the best rows
+    for transposed in (False, True):
+        rows = [tuple(row) for row in (zip(*grid) if transposed else grid)]
+        for r in range(BOX):
+            states.append((rows, (r,), (), {}, transposed))
+    key = []
+    for stack_orders in STACK_ORDERS:
+        best = None
+        ties = []
+        for rows, sources, order, labels, transposed in states:
+            row = rows[sources[0]]
+            for columns in stack_orders:
+                new_labels = dict(labels)
+                out = relabel_row(row, columns, new_labels)
+                if best is None or out < best:
+                    best, ties = out, []
+                if out == best:
+                    ties.append((rows, sources, order + columns, new_labels, transposed))
+        states = ties
+        key.extend(best)
+
+    for i in range(1, SIZE):
+        band = i // BOX * BOX
+        best = None
+        ties = []
+        for rows, sources, order, labels, transposed in states:
+            for r in range(band, band + BOX):
+                if r in sources:
+                    continue
+                new_labels = dict(labels)
+                out = relabel_row(rows[r], order, new_labels)
+                if best is None or out < best:
+                    best, ties = out, []
+                if out == best:
+                    ties.append((rows, sources + (r,), order, new_labels, transposed))
+        if len(ties) > MAX_TIES:
+            return None, None
+        states = ties
+        key.extend(best)
+
+    _, sources, order, labels, transposed = states[0]
+    return bytes(key), (transposed, sources, order, labels)
+
+
+# digit labels extended to every digit, the ones absent from the puzzle taking the labels left over
+def full_labels(labels):
+    labels = dict(labels)
+    free = iter(range(len(labels) + 1, SIZE + 1))
+    for value in range(1, SIZE + 1):
+        if value not in labels:
+            labels[value] = next(free)
+    return labels
+
+
+# solution of the source puzzle -> solution of its canonical form
+def to_canonical(solution, transform):
+    transposed, sources, order, labels = transform
+    labels = full_labels(labels)
+    rows = list(zip(*solution)) if transposed else solution
+    return bytes(labels[rows[r][c]] for r in sources for c in order)
+
+
+# solution of the canonical form -> solution of the source puzzle
+def from_canonical(solution, transform):
+    transposed, sources, order, labels = transform
+    values = {label: value for value, label in full_labels(labels).items()}
+    rows = [[0] * SIZE for _ in range(SIZE)]
+    for i, r in enumerate(sources):
+        for j, c in enumerate(order):
+            rows[r][c] = values[solution[i * SIZE + j]]
+    return [list(row) for row in zip(*rows)] if transposed else rows
+
+
+# LRU cache of solutions in front of the solvers (see SudokuSolverCSP's `cache` argument).
+# Exact repeats are a dict lookup; isomorphic 9x9 puzzles cost one canonical_form() call. With a
+# path, canonical solutions are also kept in an SQLite file and survive restarts. Safe to share
+# between threads.
+class SolutionCache:
+    def __init__(self, maxsize=4096, path=None):
+        self.maxsize = maxsize
+        self.exact = OrderedDict()  # puzzle key -> solution key
+        self.canonical = OrderedDict()  # canonical puzzle -> canonical solution
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS solutions (puzzle BLOB PRIMARY KEY, solution BLOB NOT NULL)")
+
+    def __len__(self):
+        return len(self.exact)
+
+    def remember(self, entries, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    # solution grid of `grid`, or None when neither it nor an isomorphic puzzle is cached
+    def get(self, grid):
+        return self.lookup(grid)[0]
+
+    # (solution grid or None, canonical form of `grid`), the canonical form being what
+    # canonical_form() returned, or None when the lookup did not need it (exact hits, grids other
+    # than 9x9); put() takes it back so a miss followed by a solve only computes it once
+    def lookup(self, grid):
+        key = grid_key(grid)
+        n = len(grid)
+        with self.lock:
+            solution = self.exact.get(key)
+            if solution is not None:
+                self.exact.move_to_end(key)
+                self.hits += 1
+                return [list(solution[r * n:r * n + n]) for r in range(n)], None
+            if n != SIZE:
+                self.misses += 1
+                return None, None
+
+        canonical = canonical_form(grid)
+        canonical_key, transform = canonical
+        if canonical_key is None:
+            with self.lock:
+                self.misses += 1
+            return None, canonical
+        with self.lock:
+            solution = self.canonical.get(canonical_key)
+            if solution is None and self.db is not None:
+                row = self.db.execute("SELECT solution FROM solutions WHERE puzzle = ?", (canonical_key,)).fetchone()
+                if row is not None:
+                    solution = row[0]
+            if solution is None:
+                self.misses += 1
+                return None, canonical
+            self.remember(self.canonical, canonical_key, solution)
+            self.hits += 1
+        solution = from_canonical(solution, transform)
+        with self.lock:
+            self.remember(self.exact, key, grid_key(solution))
+        return solution, canonical
+
+    # `canonical` is the grid's canonical form from lookup(), when already computed
+    def put(self, grid, solution, canonical=None):
+        canonical_key = None
+        if len(grid) == SIZE:
+            canonical_key, transform = canonical or canonical_form(grid)
+        with self.lock:
+            self.remember(self.exact, grid_key(grid), grid_key(solution))
+            if canonical_key is None:
+                return
+            canonical_solution = to_canonical(solution, transform)
+            self.remember(self.canonical, canonical_key, canonical_solution)
+            if self.db is not None:
+                with self.db:
+                    self.db.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?)", (canonical_key, canonical_solution))
+
+    # Fills the solver's puzzle and steps from the cache. Returns False on a miss, leaving the
+    # puzzle's canonical form in solver.canonical for the put() after the solve.
+    def load(self, solver):
+        solution, solver.canonical = self.lookup(solver.puzzle)
+        if solution is None:
+            return False
+        for r, row in enumerate(solution):
+            for c, value in enumerate(row):
+                if not solver.puzzle[r][c]:
+                    solver.puzzle[r][c] = value
+                    solver.steps_queue.append(((r, c), value))
+        return True
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
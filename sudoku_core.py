@@ -0,0 +1,84 @@
+from sudoku_board import Board
+from sudoku_solver import Budget, generate_puzzle, make_solver
+
+# Validation, generation and solving entry points without the GUI. Importing this module only
+# pulls in the CSP solver and the standard library modules it needs; the solution cache (sqlite3),
+# the DLX and portfolio solvers and NumPy are imported when first used, so short-lived CLI and
+# worker processes start in a few milliseconds. main.py is a Tk client on top of it.
+
+MIN_FILLED = 20  # fewest givens a board must have before it is solved
+# clues left in a generated puzzle for each difficulty; removing clues greedily ends between 22
+# and 26 givens, so 24 is as sparse as Hard can be while being reached reliably
+DIFFICULTY_CLUES = {"Easy": 38, "Medium": 30, "Hard": 24}
+GENERATE_TIME_LIMIT = 1.0  # seconds a generation may retry to reach its difficulty's clue count
+
+SOLVE_FINISHED = object()  # queued after the last step of a solved board
+SOLVE_FAILED = object()  # queued when the board has no solution
+SOLVE_TIMED_OUT = object()  # queued when the search gave up after SOLVE_TIMEOUT seconds
+SOLVE_TIMEOUT = 30  # longest an interactive solve may search, so a hopeless custom board cannot hang it
+
+
+def count_non_empty(board):
+    return board.filled
+
+
+def is_valid(board, num, row, col):
+    return board.can_place(row, col, num)
+
+
+def is_valid_board(board):
+    return board.is_valid()
+
+
+# why the board cannot be solved as it is, or None when it can
+def board_error(board):
+    if not is_valid_board(board):
+        return "Each number in the board cannot be repeated in a row, a column or in a 3x3 grid"
+    if count_non_empty(board) < MIN_FILLED:
+        return f"Board must have at least {MIN_FILLED} filled cells."
+    return None
+
+
+# (puzzle Board, solution Board) with a unique solution for one of DIFFICULTY_CLUES
+def new_game(difficulty):
+    puzzle, solution = generate_puzzle(DIFFICULTY_CLUES[difficulty], time_limit=GENERATE_TIME_LIMIT)
+    return Board.from_grid(puzzle), Board.from_grid(solution)
+
+
+# SolutionCache (see sudoku_cache) for the solving entry points below
+def open_solution_cache(path=None):
+    from sudoku_cache import SolutionCache
+
+    return SolutionCache(path=path)
+
+
+# Solves the board, giving up after SOLVE_TIMEOUT seconds unless another budget is given.
+# Returns (True, steps) when it is solved and (False, []) otherwise; raises ValueError with
+# board_error() for a board that cannot be solved as it is.
+def solve_sudoku(board, strategy="csp", cache=None, budget=None):
+    error = board_error(board)
+    if error is not None:
+        raise ValueError(error)
+    if budget is None:
+        budget = Budget(timeout=SOLVE_TIMEOUT)
+    solver = make_solver(board.to_grid(), strategy, cache, budget)
+    if solver.solve():
+        return True, solver.steps_queue
+    return False, []
+
+
+# Worker-thread side of an interactive solve: puts the solver's steps on `steps` as they are
+# committed, then SOLVE_FINISHED, SOLVE_FAILED or SOLVE_TIMED_OUT. `cancelled` (a
+# CancellationToken) stops the search itself, not just the stream of steps.
+def stream_solve(board, steps, cancelled, strategy="csp", cache=None):
+    solver = make_solver(board.to_grid(), strategy, cache, Budget(timeout=SOLVE_TIMEOUT, cancel=cancelled))
+    for step in solver.solve_iter():
+        if cancelled.is_set():
+            return
+        steps.put(step)
+    if solver.stats.cancelled:
+        return
+    if solver.stats.budget_exceeded:
+        steps.put(SOLVE_TIMED_OUT)
+    else:
+        steps.put(SOLVE_FINISHED if solver.stats else SOLVE_FAILED)
@@ -0,0 +1,250 @@
+from time import perf_counter_ns
+
+from sudoku_solver import SolverStats, cached_solve_iter, grid_box_size
+
+# Exact-cover solver using Knuth's Dancing Links (Algorithm X) on the standard Sudoku matrix:
+# one row per (cell, digit), 729 for a 9x9 grid, and one column per constraint, 324 for a 9x9
+# grid: every cell holds a digit, and every row, column and box holds every digit once. Same
+# interface as SudokuSolverCSP.
+
+
+# the four columns covered by placing `digit` (1-n) at (r, c): the cell constraints come first,
+# then the row, column and box ones, n * n columns per group
+def candidate_columns(r, c, digit, box_size=3):
+    n = box_size * box_size
+    group = n * n
+    d = digit - 1
+    b = (r // box_size) * box_size + c // box_size
+    return r * n + c, group + r * n + d, 2 * group + c * n + d, 3 * group + b * n + d
+
+
+# Node 0 is the root, nodes 1-324 the column headers (column k is node k + 1), and every
+# candidate (r, c, digit) adds four nodes linked left/right in a ring. The full matrix is built
+# once per box size; each solver copies the link arrays and shares the rest.
+def build_matrix(box_size=3):
+    n = box_size * box_size
+    headers = 4 * n * n
+    left = [headers] + list(range(headers))
+    right = list(range(1, headers + 1)) + [0]
+    up = list(range(headers + 1))
+    down = list(range(headers + 1))
+    column = list(range(headers + 1))
+    size = [0] * (headers + 1)
+    candidate = [None] * (headers + 1)  # (r, c, digit) of every non-header node
+
+    for r in range(n):
+        for c in range(n):
+            for digit in range(1, n + 1):
+                first = len(left)
+                for offset, col in enumerate(candidate_columns(r, c, digit, box_size)):
+                    node = first + offset
+                    header = col + 1
+                    left.append(first + (offset - 1) % 4)
+                    right.append(first + (offset + 1) % 4)
+                    up.append(up[header])
+                    down.append(header)
+                    down[up[header]] = node
+                    up[header] = node
+                    column.append(header)
+                    candidate.append((r, c, digit))
+                    size[header] += 1
+    return left, right, up, down, size, tuple(column), tuple(candidate)
+
+
+MATRICES = {}  # box size -> shared link arrays
+
+
+def get_matrix(box_size=3):
+    matrix = MATRICES.get(box_size)
+    if matrix is None:
+        matrix = MATRICES[box_size] = build_matrix(box_size)
+    return matrix
+
+
+MATRIX = get_matrix(3)
+
+
+class SudokuSolverDLX:
+    def __init__(self, puzzle, cache=None, budget=None):
+        self.puzzle = puzzle  # n x n grid (9x9, 16x16, 25x25, ...) with 0 for empty cells
+        self.box_size = grid_box_size(puzzle)
+        self.steps_queue = []  # queue to store the steps of the solution
+        self.stats = SolverStats()
+        left, right, up, down, size, self.column, self.candidate = get_matrix(self.box_size)
+        self.left, self.right, self.up, self.down, self.size = left[:], right[:], up[:], down[:], size[:]
+        self.chosen = []  # rows of the current partial solution
+        self.cache = cache  # SolutionCache consulted before solving and filled after, see sudoku_cache
+        self.canonical = None  # canonical form of the puzzle, kept by the cache from load() to put()
+        self.budget = budget  # Budget limiting the solve (see sudoku_solver), None for no limit
+
+    def cover(self, header):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        right[left[header]] = right[header]
+        left[right[header]] = left[header]
+        i = down[header]
+        while i != header:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def uncover(self, header):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        i = up[header]
+        while i != header:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[header]] = header
+        left[right[header]] = header
+
+    # covers the other columns of a chosen row
+    def select(self, node):
+        j = self.right[node]
+        while j != node:
+            self.cover(self.column[j])
+            j = self.right[j]
+
+    def unselect(self, node):
+        j = self.left[node]
+        while j != node:
+            self.uncover(self.column[j])
+            j = self.left[j]
+
+    # Covers the rows of the givens. Returns False when two givens clash.
+    def place_givens(self):
+        n = len(self.puzzle)
+        for r in range(n):
+            for c in range(n):
+                digit = self.puzzle[r][c]
+                if not digit:
+                    continue
+                columns = candidate_columns(r, c, digit, self.box_size)
+                for col in columns:
+                    if self.right[self.left[col + 1]] != col + 1:
+                        return False  # constraint already satisfied by another given
+                header = columns[0] + 1
+                node = self.down[header]
+                while self.candidate[node] != (r, c, digit):
+                    node = self.down[node]
+                self.cover(header)
+                self.select(node)
+        return True
+
+    # column with the fewest remaining rows
+    def choose_column(self):
+        best = None
+        best_size = None
+        header = self.right[0]
+        while header != 0:
+            if best_size is None or self.size[header] < best_size:
+                best, best_size = header, self.size[header]
+                if best_size <= 1:
+                    break
+            header = self.right[header]
+        return best
+
+    # Algorithm X over an explicit stack of chosen rows. Yields with self.chosen holding the rows
+    # of each solution, and carries on to the next one when resumed.
+    def search(self):
+        stats = self.stats
+        budget = self.budget
+        down = self.down
+        self.chosen = chosen = []
+        while True:
+            if self.right[0] == 0:
+                yield True
+                node = None  # resume by backtracking
+            else:
+                header = self.choose_column()
+                self.cover(header)
+                node = down[header]
+                if node == header:
+                    self.uncover(header)
+                    node = None
+                elif budget is not None and budget.exhausted(stats):
+                    self.uncover(header)
+                    return
+                else:
+                    stats.nodes += 1
+                    self.select(node)
+                    chosen.append(node)
+                    stats.max_depth = max(stats.max_depth, len(chosen))
+                    continue
+
+            # backtrack to the innermost row with an untried alternative
+            while True:
+                if not chosen:
+                    return
+                node = chosen.pop()
+                self.unselect(node)
+                header = self.column[node]
+                node = down[node]
+                if node != header:
+                    if budget is not None and budget.exhausted(stats):
+                        self.uncover(header)
+                        return
+                    stats.nodes += 1
+                    self.select(node)
+                    chosen.append(node)
+                    break
+                self.uncover(header)
+                stats.backtracks += 1
+
+    # grid of the givens and the rows chosen so far, 0 elsewhere (see SudokuSolverCSP.current_grid)
+    def current_grid(self):
+        grid = [row[:] for row in self.puzzle]
+        for node in self.chosen:
+            r, c, digit = self.candidate[node]
+            grid[r][c] = digit
+        return grid
+
+    def fill_solution(self):
+        for node in self.chosen:
+            r, c, digit = self.candidate[node]
+            self.puzzle[r][c] = digit
+            self.steps_queue.append(((r, c), digit))
+
+    # returns the SolverStats of this solve, truthy when a solution was found
+    def solve(self):
+        for _ in self.solve_iter():
+            pass
+        return self.stats
+
+    # same contract as SudokuSolverCSP.solve_iter(); every step comes once the search is done
+    def solve_iter(self):
+        return cached_solve_iter(self, self.solve_steps)
+
+    def solve_steps(self):
+        stats = self.stats = SolverStats()
+        if self.budget is not None:
+            self.budget.start()
+        start = perf_counter_ns()
+        stats.solved = int(self.place_givens() and next(self.search(), False))
+        if stats.solved:
+            self.fill_solution()
+        stats.search_ns = perf_counter_ns() - start
+        yield from self.steps_queue
+
+    # Number of solutions of the puzzle, stopping as soon as `limit` have been found.
+    def count_solutions(self, limit=2):
+        stats = self.stats = SolverStats()
+        if self.budget is not None:
+            self.budget.start()
+        start = perf_counter_ns()
+        found = 0
+        if self.place_givens():
+            for _ in self.search():
+                found += 1
+                if found >= limit:
+                    break
+        stats.solved = int(found > 0)
+        stats.search_ns = perf_counter_ns() - start
+        return found
@@ -0,0 +1,142 @@
+import numpy as np
+
+from sudoku_solver import make_solver
+
+# Vectorised propagation for many 9x9 puzzles at once. A batch of N puzzles is an (N, 81, 9)
+# boolean candidate tensor; each round eliminates naked singles from their peers and places
+# hidden singles for every puzzle at once with row, column and box reductions over that tensor.
+# Only the puzzles still ambiguous afterwards go to a scalar solver (SudokuSolverCSP by default).
+
+# result status of each puzzle
+AMBIGUOUS = 0
+SOLVED = 1
+CONTRADICTION = -1
+
+
+# list of 81-character strings ("." or "0" for empty cells) -> (N, 81) array of digits
+def parse_puzzles(lines):
+    text = np.frombuffer("".join(lines).encode("ascii"), dtype=np.uint8).reshape(-1, 81)
+    digits = text.astype(np.int8) - ord("0")
+    digits[text == ord(".")] = 0
+    return digits
+
+
+# (N, 81) digits with 0 for empty cells -> (N, 81, 9) candidates
+def grids_to_candidates(grids):
+    grids = np.asarray(grids, dtype=np.int8).reshape(-1, 81)
+    candidates = np.ones(grids.shape + (9,), dtype=bool)
+    given = grids > 0
+    candidates[given] = False
+    candidates[given, grids[given] - 1] = True
+    return candidates
+
+
+# (N, 81, 9) candidates -> (N, 81) digits with 0 wherever more than one candidate is left
+def candidates_to_grids(candidates):
+    grids = candidates.argmax(axis=2).astype(np.int8) + 1
+    grids[candidates.sum(axis=2) != 1] = 0
+    return grids
+
+
+# sum of a 0/1 int8 tensor along one axis, as a chain of slice additions: with the puzzles
+# on the last axis every slice is made of contiguous runs, which numpy adds far faster than a
+# reduction over a short strided axis
+def axis_total(cells, axis):
+    parts = np.moveaxis(cells, axis, 0)
+    total = parts[0].copy()
+    for part in parts[1:]:
+        total += part
+    return total
+
+
+# per-unit digit totals of a (row, column, digit, n) int8 tensor: (row, digit, n),
+# (column, digit, n) and (box row, box column, digit, n)
+def unit_totals(cells):
+    n = cells.shape[-1]
+    rows = axis_total(cells, 1)
+    columns = axis_total(cells, 0)
+    boxes = axis_total(axis_total(cells.reshape(3, 3, 3, 3, 9, n), 3), 1)
+    return rows, columns, boxes
+
+
+# a per-box tensor repeated over the nine cells of each box, as (row, column, ...)
+def spread_boxes(boxes):
+    shape = boxes.shape[2:]
+    spread = np.broadcast_to(boxes[:, None, :, None], (3, 3, 3, 3) + shape)
+    return spread.reshape((9, 9) + shape)
+
+
+# Propagates every puzzle to a fixpoint of naked and hidden singles. Returns the reduced
+# candidates and the status of each puzzle (SOLVED, AMBIGUOUS or CONTRADICTION).
+def propagate(candidates):
+    result = np.array(candidates, dtype=bool)
+    status = np.full(len(result), AMBIGUOUS, dtype=np.int8)
+    # the puzzles still changing, as a (row, column, digit, n) 0/1 tensor
+    current = np.ascontiguousarray(result.view(np.int8).reshape(-1, 9, 9, 9).transpose(1, 2, 3, 0))
+    active = np.arange(len(result))
+
+    while len(active):
+        # naked singles: remove each placed digit from the cell's peers
+        counts = axis_total(current, 2)  # (row, column, n)
+        placed = current * (counts == 1)[:, :, None]
+        rows, columns, boxes = unit_totals(placed)
+        # every placed digit is counted once in each of its own three units
+        blocked = rows[:, None] + columns[None, :] + spread_boxes(boxes) - 3 * placed
+        reduced = current & (blocked == 0)
+
+        # hidden singles: a digit with a single place left in a unit goes there
+        rows, columns, boxes = unit_totals(reduced)
+        lonely = reduced & ((rows == 1)[:, None] | (columns == 1)[None, :] | spread_boxes(boxes == 1))
+        lonely_counts = axis_total(lonely, 2)
+        reduced = lonely | (reduced & (lonely_counts == 0)[:, :, None])
+        reduced_counts = axis_total(reduced, 2)
+
+        dead = (
+            # a digit with no place left in a unit
+            (rows == 0).any(axis=(0, 1)) | (columns == 0).any(axis=(0, 1)) | (boxes == 0).any(axis=(0, 1, 2))
+            | (lonely_counts > 1).any(axis=(0, 1))  # a cell forced to two digits
+            | (reduced_counts == 0).any(axis=(0, 1))  # a cell with no candidates
+        )
+        changed = (reduced_counts != counts).any(axis=(0, 1))
+        finished = dead | ~changed
+        if finished.any():
+            done = active[finished]
+            result[done] = reduced[..., finished].transpose(3, 0, 1, 2).reshape(-1, 81, 9)
+            status[done] = np.where(
+                dead[finished], CONTRADICTION,
+                np.where((reduced_counts[:, :, finished] == 1).all(axis=(0, 1)), SOLVED, AMBIGUOUS),
+            )
+            active = active[~finished]
+            reduced = reduced[..., ~finished]
+        current = reduced
+
+    return result, status
+
+
+# Propagates a batch of puzzles given as (N, 81) digits. Returns the (N, 81) grids after
+# propagation, with rows of zeros for puzzles found unsolvable, and the status of each puzzle.
+def propagate_batch(grids):
+    candidates, status = propagate(grids_to_candidates(grids))
+    solutions = candidates_to_grids(candidates)
+    solutions[status == CONTRADICTION] = 0
+    return solutions, status
+
+
+# Solves the AMBIGUOUS puzzles left by propagate_batch() in place with the `strategy` solver (each
+# one limited by `budget` when given), zeroing the rows it finds unsolvable. Returns the
+# SolverStats of each of them, keyed by its index.
+def solve_ambiguous(solutions, status, strategy="csp", budget=None):
+    fallback_stats = {}
+    for index in np.flatnonzero(status == AMBIGUOUS):
+        puzzle = solutions[index].reshape(9, 9).tolist()
+        stats = fallback_stats[index] = make_solver(puzzle, strategy, budget=budget).solve()
+        solutions[index] = np.array(puzzle, dtype=np.int8).reshape(81) if stats else 0
+    return fallback_stats
+
+
+# Solves a batch of puzzles given as (N, 81) digits. Returns the (N, 81) solutions, with rows
+# of zeros for unsolvable puzzles, the status each puzzle had after vectorised propagation, and
+# the SolverStats of every puzzle that was handed to the `strategy` solver, keyed by its index.
+def solve_batch(grids, strategy="csp", budget=None):
+    solutions, status = propagate_batch(grids)
+    return solutions, status, solve_ambiguous(solutions, status, strategy, budget)
@@ -0,0 +1,234 @@
+import mmap
+import struct
+
+# Packed corpora: 9x9 puzzles, and optionally their solutions, at 4 bits a cell (41 bytes a grid)
+# in fixed-size records after a 16-byte header. The header is the index: record i starts at
+# HEADER.size + i * record size, so a reader maps the file and hands out slices of it, memoryviews
+# or NumPy arrays, without reading or parsing the puzzles it does not touch.
+#
+#   header  magic "SDKP", version (u8), flags (u8), record size (u16), record count (u64),
+#           little-endian
+#   record  puzzle grid, then its solution grid when flags has HAS_SOLUTIONS (all zeros when
+#           the solution is unknown)
+#
+# A grid is its 81 cells in reading order, two to a byte with the first in the high nibble and 0
+# for an empty cell; the low nibble of the last byte is unused.
+
+MAGIC = b"SDKP"
+VERSION = 1
+HAS_SOLUTIONS = 1
+HEADER = struct.Struct("<4sBBHQ")
+CELLS = 81
+GRID_BYTES = (CELLS + 1) // 2
+EMPTY_GRID = bytes(GRID_BYTES)
+
+TEXT_VALUES = bytes.maketrans(b".0123456789", b"\0\0\1\2\3\4\5\6\7\x08\x09")  # puzzle text -> cell values
+VALUE_TEXT = b".123456789".ljust(256, b"?")  # cell values -> puzzle text
+HIGH = bytes(byte >> 4 for byte in range(256))
+LOW = bytes(byte & 15 for byte in range(256))
+
+
+# 81-character puzzle text ("." or "0" for empty cells) or 9x9 grid -> 41 packed bytes
+def pack(puzzle):
+    if isinstance(puzzle, str):
+        if len(puzzle) != CELLS or not set(puzzle) <= set(".0123456789"):
+            raise ValueError(f"not an 81-cell puzzle: {puzzle!r}")
+        values = puzzle.encode("ascii").translate(TEXT_VALUES)
+    else:
+        values = bytes(value for row in puzzle for value in row)
+        if len(values) != CELLS or max(values) > 9:
+            raise ValueError("not a 9x9 grid")
+    return bytes(high << 4 | low for high, low in zip(values[0::2], values[1::2] + b"\0"))
+
+
+# 41 packed bytes -> the 81 cell values, one byte each
+def unpack_values(packed):
+    packed = bytes(packed)
+    values = bytearray(GRID_BYTES * 2)
+    values[0::2] = packed.translate(HIGH)
+    values[1::2] = packed.translate(LOW)
+    return bytes(values[:CELLS])
+
+
+def unpack_text(packed):
+    return unpack_values(packed).translate(VALUE_TEXT).decode("ascii")
+
+
+def unpack_grid(packed):
+    values = unpack_values(packed)
+    return [list(values[r * 9:r * 9 + 9]) for r in range(9)]
+
+
+# (N, 41) uint8 packed grids -> (N, 81) int8 cell values, the layout sudoku_numpy works on
+def unpack_array(packed):
+    import numpy as np
+
+    cells = np.empty((len(packed), GRID_BYTES * 2), dtype=np.int8)
+    cells[:, 0::2] = packed >> 4
+    cells[:, 1::2] = packed & 15
+    return np.ascontiguousarray(cells[:, :CELLS])
+
+
+# whether the file at `path` is a packed corpus rather than text
+def is_packed(path):
+    try:
+        with open(path, "rb") as source:
+            return source.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+# Writes a packed corpus a record at a time, so converting a text corpus never holds more than
+# one puzzle; the record count is filled in on close().
+class PackedWriter:
+    def __init__(self, path, solutions=False):
+        self.flags = HAS_SOLUTIONS if solutions else 0
+        self.record_size = GRID_BYTES * (2 if solutions else 1)
+        self.count = 0
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.flags, self.record_size, 0))
+
+    # puzzle and solution as 81-character text or 9x9 grids; the solution is ignored unless the
+    # writer stores solutions
+    def write(self, puzzle, solution=None):
+        self.file.write(pack(puzzle))
+        if self.flags & HAS_SOLUTIONS:
+            self.file.write(EMPTY_GRID if solution is None else pack(solution))
+        self.count += 1
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.flags, self.record_size, self.count))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Read-only view of a packed corpus through mmap. Single records come back as memoryview slices
+# of the mapping, and arrays() gives NumPy views of every record at once; neither copies.
+class PackedCorpus:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as source:
+            self.map = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            self.map.close()
+            raise ValueError(f"{path}: not a packed corpus")
+        magic, version, self.flags, self.record_size, self.count = HEADER.unpack_from(self.map)
+        expected = GRID_BYTES * (2 if self.flags & HAS_SOLUTIONS else 1)
+        if magic != MAGIC or version != VERSION or self.record_size != expected \
+                or len(self.map) < HEADER.size + self.count * self.record_size:
+            self.map.close()
+            raise ValueError(f"{path}: not a version {VERSION} packed corpus, or truncated")
+        self.view = memoryview(self.map)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def has_solutions(self):
+        return bool(self.flags & HAS_SOLUTIONS)
+
+    def record(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(f"record {i} out of range for {self.count} records")
+        offset = HEADER.size + i * self.record_size
+        return self.view[offset:offset + self.record_size]
+
+    # packed puzzle of record i, as a memoryview
+    def puzzle(self, i):
+        return self.record(i)[:GRID_BYTES]
+
+    # packed solution of record i, as a memoryview, or None when the corpus has none for it
+    def solution(self, i):
+        if not self.has_solutions:
+            return None
+        solution = self.record(i)[GRID_BYTES:]
+        return None if solution == EMPTY_GRID else solution
+
+    def text(self, i):
+        return unpack_text(self.puzzle(i))
+
+    def grid(self, i):
+        return unpack_grid(self.puzzle(i))
+
+    # (record number from 1, puzzle text) for every record, like sudoku_batch.read_puzzles()
+    def __iter__(self):
+        for i in range(self.count):
+            yield i + 1, self.text(i)
+
+    # (puzzles, solutions) as (count, 41) uint8 arrays viewing the mapping, solutions None when
+    # the corpus has none
+    def arrays(self):
+        import numpy as np
+
+        records = np.frombuffer(self.map, dtype=np.uint8, count=self.count * self.record_size,
+                                offset=HEADER.size).reshape(self.count, self.record_size)
+        return records[:, :GRID_BYTES], records[:, GRID_BYTES:] if self.has_solutions else None
+
+    # (stop - start, 81) int8 cell values of the puzzles of records [start, stop)
+    def digits(self, start=0, stop=None):
+        return unpack_array(self.arrays()[0][start:stop])
+
+    # the corpus as PackedChunks of `size` records
+    def chunks(self, size):
+        for start in range(0, self.count, size):
+            yield PackedChunk(self.path, start, min(start + size, self.count))
+
+    # Unmaps the file. Every memoryview from record(), puzzle() or solution() and every array from
+    # arrays() or digits() views the mapping and must be dropped first; while one is alive, close()
+    # raises BufferError and leaves the corpus open and usable.
+    def close(self):
+        if self.map.closed:
+            return
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            self.view = memoryview(self.map)
+            raise BufferError(f"{self.path}: records or arrays of the corpus are still in use") from None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# PackedCorpus per path in this process, shared by every chunk read from it
+CORPORA = {}
+
+
+def open_packed(path):
+    corpus = CORPORA.get(path)
+    if corpus is None:
+        corpus = CORPORA[path] = PackedCorpus(path)
+    return corpus
+
+
+# Records [start, stop) of a packed corpus, usable wherever sudoku_batch takes a chunk of
+# (line number, puzzle text) pairs. It pickles as just its path and range, so a worker process
+# maps the file itself instead of being sent the puzzles.
+class PackedChunk:
+    def __init__(self, path, start, stop):
+        self.path = path
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        corpus = open_packed(self.path)
+        for i in range(self.start, self.stop):
+            yield i + 1, corpus.text(i)
+
+    # (len(self), 81) int8 cell values, for sudoku_numpy
+    def digits(self):
+        return open_packed(self.path).digits(self.start, self.stop)
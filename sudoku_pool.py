@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+from collections import deque
+
+from sudoku_core import DIFFICULTY_CLUES, GENERATE_TIME_LIMIT
+from sudoku_solver import generate_puzzle
+
+
+# Keeps `size` ready (puzzle, solution) pairs per difficulty so starting a game is a pop
+# instead of a generation. A daemon thread tops the pools up after every pop, and the pools
+# can be saved to `path` and loaded back on the next run.
+class PuzzlePool:
+    def __init__(self, size=5, path=None, difficulties=DIFFICULTY_CLUES):
+        self.size = size
+        self.path = path
+        self.difficulties = dict(difficulties)
+        self.pools = {difficulty: deque() for difficulty in self.difficulties}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()  # set when a pool may need refilling
+        self.stopped = False
+        self.worker = None
+        if path is not None:
+            self.load()
+
+    def start(self):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.refill, name="puzzle-pool", daemon=True)
+            self.worker.start()
+        self.wake.set()
+
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
+
+    # ready puzzles left for a difficulty
+    def available(self, difficulty):
+        return len(self.pools[difficulty])
+
+    # (puzzle, solution) for the difficulty, generated on the spot only if its pool is empty
+    def pop(self, difficulty):
+        with self.lock:
+            pool = self.pools[difficulty]
+            item = pool.popleft() if pool else None
+        self.wake.set()
+        if item is None:
+            item = generate_puzzle(self.difficulties[difficulty], time_limit=GENERATE_TIME_LIMIT)
+        return item
+
+    # the worker: generate for the emptiest pool until every pool is full, then sleep until a pop
+    def refill(self):
+        while not self.stopped:
+            with self.lock:
+                difficulty = min(self.pools, key=lambda name: len(self.pools[name]))
+                missing = len(self.pools[difficulty]) < self.size
+                if not missing:
+                    self.wake.clear()
+            if not missing:
+                self.wake.wait()
+                continue
+            item = generate_puzzle(self.difficulties[difficulty], time_limit=GENERATE_TIME_LIMIT)
+            with self.lock:
+                self.pools[difficulty].append(item)
+
+    def save(self):
+        with self.lock:
+            data = {difficulty: list(pool) for difficulty, pool in self.pools.items()}
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(temp_path, self.path)
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return  # no saved pool yet, or an unreadable one: start empty
+        with self.lock:
+            for difficulty, items in data.items():
+                if difficulty in self.pools:
+                    self.pools[difficulty].extend((puzzle, solution) for puzzle, solution in items)
@@ -0,0 +1,161 @@
+import multiprocessing
+import queue
+import random
+from time import perf_counter_ns
+
+from sudoku_solver import (HIDDEN_SINGLES, PAIRS, POINTING_CLAIMING, Budget, SolverStats, SudokuSolverCSP,
+                           cached_solve_iter, grid_box_size, make_solver)
+
+# Portfolio solving: the run time of a randomised backtracking search is heavy-tailed, so racing
+# several differently seeded and configured solvers in separate processes and keeping the first
+# answer cuts the tail on hard puzzles. The CSP members restart their search on a Luby schedule,
+# and the DLX member adds a differently shaped search to the race.
+
+# (strategy, inference level) of each racer, repeated when there are more workers than entries
+PORTFOLIO = (("csp", POINTING_CLAIMING), ("dlx", None), ("csp", PAIRS), ("csp", HIDDEN_SINGLES))
+RESTART_UNIT = 64  # search nodes of the shortest run in the restart schedule
+RACE_POLL_SECONDS = 0.05  # how often a race checks its budget's deadline and cancellation token
+
+
+# Luby's universal restart sequence (i >= 1): 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ...
+def luby(i):
+    while True:
+        k = i.bit_length()
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+
+
+# Solves with restarts: run i of the search gives up after unit * luby(i) nodes and the next run
+# starts over with a new seed drawn from `seed`, until a run either solves the puzzle or proves it
+# has no solution. `budget` bounds all the runs together. Returns the last solver and the stats of
+# all runs together.
+def solve_with_restarts(puzzle, seed=None, unit=RESTART_UNIT, inference=POINTING_CLAIMING, budget=None):
+    if budget is None:
+        budget = Budget()
+    budget.start()
+    seeds = random.Random(seed)
+    runs = []
+    i = 1
+    while True:
+        run_budget = Budget(unit * luby(i), budget.remaining(), cancel=budget.cancel)
+        solver = SudokuSolverCSP([row[:] for row in puzzle], inference, seed=seeds.getrandbits(64), budget=run_budget)
+        runs.append(solver.solve())
+        stats = SolverStats.total(runs)
+        stats.solves = 1
+        stats.restarts = i - 1
+        stats.budget_exceeded = 0
+        if not solver.stats.budget_exceeded or budget.exhausted(stats):
+            return solver, stats
+        i += 1
+
+
+def portfolio_worker(index, puzzle, seed, unit, budget, results):
+    strategy, inference = PORTFOLIO[index % len(PORTFOLIO)]
+    if strategy == "csp":
+        solver, stats = solve_with_restarts(puzzle, seed, unit, inference, budget)
+    else:
+        solver = make_solver(puzzle, strategy, budget=budget)
+        stats = solver.solve()
+    results.put((index, solver.current_grid(), solver.steps_queue, stats.as_dict()))
+
+
+# Races `workers` solvers from PORTFOLIO in separate processes and keeps the first one to finish,
+# terminating the others. Seeds are derived from `seed`, so every racer's run is reproducible;
+# which racer wins can still depend on timing. Each racer gets the node and propagation limits of
+# `budget`, while its timeout and cancellation token end the race as a whole. Same interface as
+# SudokuSolverCSP.
+class SudokuSolverPortfolio:
+    def __init__(self, puzzle, workers=4, seed=0, unit=RESTART_UNIT, cache=None, budget=None):
+        self.box_size = grid_box_size(puzzle)  # rejects malformed grids here rather than in every racer
+        self.puzzle = puzzle
+        self.workers = workers
+        self.seed = seed
+        self.unit = unit
+        self.steps_queue = []
+        self.stats = SolverStats()
+        self.winner = None  # (strategy, inference level) of the racer that answered
+        self.cache = cache  # SolutionCache consulted before racing and filled after, see sudoku_cache
+        self.canonical = None  # canonical form of the puzzle, kept by the cache from load() to put()
+        self.budget = budget
+        self.reached = None  # grid of the winning racer: its solution, or how far it got
+
+    # (index of the winning racer, its grid, steps, stats dict), or None when the budget's
+    # timeout or cancellation token ended the race first (recorded in self.stats). Raises
+    # RuntimeError when every racer exits without answering (crashed or killed).
+    def race(self):
+        budget = self.budget or Budget()
+        racer_budget = Budget(budget.max_nodes, max_propagations=budget.max_propagations)
+        seeds = random.Random(self.seed)
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=portfolio_worker, daemon=True,
+                                    args=(index, self.puzzle, seeds.getrandbits(64), self.unit, racer_budget, results))
+            for index in range(self.workers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            reported = 0
+            last = None  # latest answer of a racer that ran out of budget
+            exited = False  # every racer had exited at the previous poll
+            while True:
+                try:
+                    result = results.get(timeout=RACE_POLL_SECONDS)
+                except queue.Empty:
+                    if budget.exhausted(self.stats):
+                        return None
+                    # a racer that died puts nothing; once all have exited, one more poll
+                    # collects anything still in flight before giving up
+                    if exited:
+                        if last is not None:
+                            return last
+                        raise RuntimeError("every portfolio racer exited without an answer")
+                    exited = all(process.exitcode is not None for process in processes)
+                    continue
+                # a racer that ran out of budget only answers once every racer has
+                reported += 1
+                last = result
+                if not result[3]["budget_exceeded"] or reported == self.workers:
+                    return result
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                process.join()
+
+    # grid the winning racer reached, the puzzle itself when no racer answered
+    def current_grid(self):
+        return [row[:] for row in (self.reached or self.puzzle)]
+
+    # returns the SolverStats of the winning racer, truthy when a solution was found
+    def solve(self):
+        for _ in self.solve_iter():
+            pass
+        return self.stats
+
+    # same contract as SudokuSolverCSP.solve_iter(); every step comes once the race is over
+    def solve_iter(self):
+        return cached_solve_iter(self, self.solve_steps)
+
+    def solve_steps(self):
+        start = perf_counter_ns()
+        self.stats = SolverStats()
+        if self.budget is not None:
+            self.budget.start()
+        result = self.race()
+        if result is None:
+            self.stats.search_ns = perf_counter_ns() - start
+            return
+        index, solution, steps, stats = result
+        self.stats = SolverStats.from_dict(stats)
+        self.winner = PORTFOLIO[index % len(PORTFOLIO)]
+        self.reached = solution
+        if self.stats:
+            for r, row in enumerate(solution):
+                self.puzzle[r][:] = row
+            self.steps_queue = steps
+        # wall time of the race, including starting and stopping the processes
+        self.stats.search_ns = perf_counter_ns() - start - self.stats.propagation_ns
+        yield from self.steps_queue
@@ -1,190 +1,824 @@
-import random
-import copy
-
-class SudokuSolverCSP:
-    def __init__(self, puzzle):
-        self.puzzle = puzzle  # 9x9 grid with 0 for empty cells
-        self.variables = [(r, c) for r in range(9) for c in range(9)]  # 81 variables (positions)
-        self.domains = self.set_domains()  # domain of each variable (initially from 1->9) if not assigned
-        self.arcs = self.generate_arcs() # all arcs between variables
-        self.steps_queue = []  # queue to store the steps of the solution
-        self.solving = False
-
-    def set_domains(self):
-        domains = {}
-        for r in range(9):
-            for c in range(9):
-                if self.puzzle[r][c] != 0:
-                    domains[(r, c)] = {self.puzzle[r][c]}
-                else:
-                    domains[(r, c)] = set(range(1, 10))
-        return domains
-
-    def generate_arcs(self):
-        # rows
-        arcs = set()
-        for r in range(9):
-            for c1 in range(9):
-                for c2 in range(c1 + 1, 9):
-                    arcs.add(((r, c1), (r, c2)))
-                    arcs.add(((r, c2), (r, c1)))
-
-        # columns
-        for c in range(9):
-            for r1 in range(9):
-                for r2 in range(r1 + 1, 9):
-                    arcs.add(((r1, c), (r2, c)))
-                    arcs.add(((r2, c), (r1, c)))
-
-        # boxes
-        for box_r in range(3):
-            for box_c in range(3):
-                cells = [(box_r * 3 + r, box_c * 3 + c) for r in range(3) for c in range(3)]
-                for i in range(len(cells)):
-                    for j in range(i + 1, len(cells)):
-                        arcs.add((cells[i], cells[j]))
-                        arcs.add((cells[j], cells[i]))
-
-        return arcs
-
-    def is_consistent(self, value, y):
-        if value in self.domains[y]:
-            return len(self.domains[y]) > 1
-        return True
-
-
-    # does the domain reduction if the value is not consistent
-    def revise(self, x, y):
-        revised = False
-        for value in set(self.domains[x]):
-            if not self.is_consistent(value, y):
-                # Print the arcs before deletion
-                if self.solving:
-                    print(f"Before deletion:")
-                    print(f"{x} -> {self.domains[x]}")
-                    print(f"{y} -> {self.domains[y]}")
-                    print(f"Inconsistent value being removed from {x}: {value}")
-
-                self.domains[x].remove(value)
-                revised = True
-
-                if self.solving:
-                    # Print the arcs after deletion
-                    print(f"After deletion:")
-                    print(f"{x} -> {self.domains[x]}")
-                    print(f"{y} -> {self.domains[y]}")
-                    print()
-
-                if len(self.domains[x]) == 1:  # Domain reduced to a single value
-                    # Add the variable and its fixed value to the queue
-                    self.steps_queue.append((x, next(iter(self.domains[x]))))
-
-        return revised
-
-
-    def apply_arc_consistency(self):
-        queue = list(self.arcs)
-        while queue:
-            x, y = queue.pop(0)
-            if self.revise(x, y):
-                if not self.domains[x]:
-                    return False  # No solution exists
-
-                for neighbor in self.get_neighbors(x):
-                    if neighbor != y:
-                        queue.append((neighbor, x))
-
-        return True
-
-    # get all neighbors of a cell (row, column, box)
-    def get_neighbors(self, cell):
-        r, c = cell
-        neighbors = set()
-        for i in range(9):
-            if i != c:
-                neighbors.add((r, i))
-            if i != r:
-                neighbors.add((i, c))
-        box_r, box_c = r // 3, c // 3
-        for i in range(box_r * 3, box_r * 3 + 3):
-            for j in range(box_c * 3, box_c * 3 + 3):
-                if (i, j) != cell:
-                    neighbors.add((i, j))
-        return neighbors
-
-
-    def fill_puzzle(self):
-        for position, domain in self.domains.items():
-            self.puzzle[position[0]][position[1]] = next(iter(domain))
-
-    def solve(self):
-        if not self.apply_arc_consistency():
-            return False
-
-        result = self.backtrack()
-        if result:
-            self.fill_rest_of_steps()
-            self.fill_puzzle()
-            return True
-
-        return False
-
-    def backtrack(self):
-
-        # solution found
-        if all(len(self.domains[var]) == 1 for var in self.variables):
-            return True
-
-        if any(len(self.domains[var]) == 0 for var in self.variables):
-            return False
-
-        # Select unassigned variable with minimum remaining values
-        unassigned_vars = [var for var in self.variables if len(self.domains[var]) > 1]
-        var = min(unassigned_vars, key=lambda var: len(self.domains[var]))
-
-
-        # Shuffle the values to be assigned to the variable to generate random solutions if multiple solutions exist
-        to_be_shuffled_values = list(self.domains[var])
-        random.shuffle(to_be_shuffled_values)
-
-        # try assigning each value to the variable
-        for value in to_be_shuffled_values:
-            old_domains = copy.deepcopy(self.domains)
-            old_steps_queue = copy.deepcopy(self.steps_queue)
-            self.domains[var] = {value}  # (0, 2)
-            if self.apply_arc_consistency():
-                if self.backtrack():
-                    return True
-
-            self.domains = old_domains
-            self.steps_queue = old_steps_queue
-        return False
-
-    def display_steps(self):
-        print("Steps to solve the Sudoku:")
-        for step in self.steps_queue:
-            print(f"Set position {step[0]} to {step[1]}")
-
-    def fill_rest_of_steps(self):
-        steps_set = set()
-        for i in range(len(self.steps_queue)):
-            steps_set.add(self.steps_queue[i][0])
-
-        for r in range(9):
-            for c in range(9):
-                if (r, c) not in steps_set and self.puzzle[r][c] == 0:
-                    self.steps_queue.append(((r, c), next(iter(self.domains[(r, c)]))))
-                    steps_set.add((r, c))
-
-# Example usage
-puzzle = [
-    [7, 9, 0, 0, 1, 3, 6, 0, 0],
-    [4, 0, 0, 0, 7, 0, 3, 0, 0],
-    [1, 0, 0, 2, 4, 0, 9, 7, 5],
-    [5, 0, 0, 6, 0, 0, 2, 0, 7],
-    [0, 7, 0, 0, 0, 1, 8, 0, 0],
-    [8, 0, 6, 9, 2, 0, 5, 0, 0],
-    [6, 0, 1, 0, 0, 2, 0, 5, 3],
-    [3, 0, 0, 0, 0, 0, 4, 0, 9],
-    [0, 2, 4, 0, 3, 5, 0, 0, 0]
-]
+import random
+import threading
+from math import isqrt
+from time import perf_counter_ns
+from collections import deque
+
+from sudoku_trace import ASSIGN, BACKTRACK, PROPAGATE, REMOVE
+
+# Each domain is a bitmask: bit (v - 1) is set when value v is still possible. These are the
+# 9x9 constants; other grid sizes take theirs from their SudokuTopology.
+ALL_VALUES = (1 << 9) - 1
+BIT_COUNT = [bin(mask).count("1") for mask in range(ALL_VALUES + 1)]
+
+
+def value_bit(value):
+    return 1 << (value - 1)
+
+
+def mask_value(mask):
+    # value of the lowest set bit (the only one for a singleton domain)
+    return (mask & -mask).bit_length()
+
+
+def mask_values(mask):
+    values = []
+    while mask:
+        low = mask & -mask
+        values.append(low.bit_length())
+        mask ^= low
+    return values
+
+
+# popcount for domains too wide for a lookup table: PopCount()[mask] == mask.bit_count()
+class PopCount:
+    __slots__ = ()
+    __getitem__ = staticmethod(int.bit_count)
+
+
+# Constraint graph of an n x n grid with box_size x box_size boxes (n = box_size ** 2). It never
+# changes, so it is built once per process and box size and shared by every solver instead of
+# being regenerated in each constructor.
+class SudokuTopology:
+    __slots__ = ("box_size", "size", "all_values", "bit_count", "variables", "cells", "units",
+                 "cell_units", "peers", "arcs", "intersections", "unit_groups", "intersection_groups")
+
+    def __init__(self, box_size=3):
+        n = box_size * box_size
+        self.box_size = box_size
+        self.size = n  # values per cell, cells per unit
+        self.all_values = (1 << n) - 1  # full domain mask
+        # domain size lookup: a table up to 16 values, int.bit_count beyond that
+        if n == 9:
+            self.bit_count = BIT_COUNT
+        elif n <= 16:
+            self.bit_count = [bin(mask).count("1") for mask in range(self.all_values + 1)]
+        else:
+            self.bit_count = PopCount()
+
+        self.variables = tuple(range(n * n))  # cell (r, c) is variable r * n + c
+        self.cells = tuple(divmod(var, n) for var in self.variables)
+
+        rows = [tuple(r * n + c for c in range(n)) for r in range(n)]
+        columns = [tuple(r * n + c for r in range(n)) for c in range(n)]
+        boxes = [tuple((box_r * box_size + r) * n + box_c * box_size + c
+                       for r in range(box_size) for c in range(box_size))
+                 for box_r in range(box_size) for box_c in range(box_size)]
+        self.units = tuple(rows + columns + boxes)
+
+        # the row, column and box of each cell, and every other cell sharing one of them
+        cell_units = [[] for _ in self.variables]
+        for unit in self.units:
+            for var in unit:
+                cell_units[var].append(unit)
+        self.cell_units = tuple(tuple(units) for units in cell_units)
+        self.peers = tuple(
+            tuple(sorted({peer for unit in self.cell_units[var] for peer in unit} - {var}))
+            for var in self.variables
+        )
+
+        # all arcs between variables (1620 for a 9x9 grid)
+        self.arcs = tuple((x, y) for x in self.variables for y in self.peers[x])
+
+        # (cells shared by a box and a line, rest of the line, rest of the box) for every box/line pair
+        intersections = []
+        for box in boxes:
+            box_cells = set(box)
+            for line in rows + columns:
+                shared = tuple(var for var in line if var in box_cells)
+                if shared:
+                    intersections.append((
+                        shared,
+                        tuple(var for var in line if var not in box_cells),
+                        tuple(var for var in box if var not in shared),
+                    ))
+        self.intersections = tuple(intersections)
+
+        # indices of the units and of the intersections each cell belongs to, the groups a
+        # propagator has to look at again once the cell's domain changed
+        self.unit_groups = tuple(tuple(i for i, unit in enumerate(self.units) if var in unit)
+                                 for var in self.variables)
+        intersection_groups = [[] for _ in self.variables]
+        for i, groups in enumerate(intersections):
+            for var in {var for cells in groups for var in cells}:
+                intersection_groups[var].append(i)
+        self.intersection_groups = tuple(tuple(groups) for groups in intersection_groups)
+
+
+TOPOLOGIES = {}  # box size -> shared SudokuTopology
+
+
+def get_topology(box_size=3):
+    topology = TOPOLOGIES.get(box_size)
+    if topology is None:
+        topology = TOPOLOGIES[box_size] = SudokuTopology(box_size)
+    return topology
+
+
+# box size of an n x n puzzle grid (3 for 9x9, 4 for 16x16, 5 for 25x25), checking that it is
+# one with every cell 0 (empty) or a value from 1 to n
+def grid_box_size(puzzle):
+    n = len(puzzle)
+    box_size = isqrt(n)
+    if box_size < 2 or box_size ** 2 != n or any(len(row) != n for row in puzzle):
+        raise ValueError(f"a puzzle must be an n x n grid with n a square number, got {n} rows")
+    for r, row in enumerate(puzzle):
+        for c, value in enumerate(row):
+            if value not in range(n + 1):
+                raise ValueError(f"cell ({r}, {c}) of a {n}x{n} puzzle holds {value!r}, not 0 to {n}")
+    return box_size
+
+
+TOPOLOGY = get_topology(3)
+
+
+# Propagators run after AC-3 has reached a fixpoint. Each one looks at groups of cells, the units
+# or the box/line intersections, and only a group with a cell whose domain changed since it was
+# last looked at can give anything new: propagate() takes the indices of the groups to look at
+# (None for all of them) and groups_of() gives the indices of the groups a cell belongs to. It
+# returns the variables it changed (empty when it found nothing) or None when it proved the
+# current state unsolvable.
+
+# a value that fits in only one cell of a unit must go there
+class HiddenSingles:
+    name = "hidden singles"
+
+    def groups_of(self, topology, var):
+        return topology.unit_groups[var]
+
+    def propagate(self, solver, groups=None):
+        domains = solver.domains
+        bit_count = solver.bit_count
+        all_values = solver.topology.all_values
+        units = solver.topology.units
+        changed = []
+        for unit in units if groups is None else (units[i] for i in groups):
+            seen_once = seen_twice = 0
+            for var in unit:
+                seen_twice |= seen_once & domains[var]
+                seen_once |= domains[var]
+            if seen_once != all_values:
+                return None  # some value has nowhere to go in this unit
+
+            unique = seen_once & ~seen_twice
+            if not unique:
+                continue
+            for var in unit:
+                hit = domains[var] & unique
+                if hit and hit != domains[var]:
+                    if bit_count[hit] > 1:
+                        return None  # two values both need this cell
+                    solver.reduce_domain(var, hit)
+                    changed.append(var)
+        return changed
+
+
+# two cells of a unit sharing the same two values (naked pair) claim them for themselves;
+# two values confined to the same two cells of a unit (hidden pair) strip those cells to the pair
+class Pairs:
+    name = "naked/hidden pairs"
+
+    def groups_of(self, topology, var):
+        return topology.unit_groups[var]
+
+    def propagate(self, solver, groups=None):
+        domains = solver.domains
+        bit_count = solver.bit_count
+        units = solver.topology.units
+        changed = []
+        for unit in units if groups is None else (units[i] for i in groups):
+            pair_cells = {}
+            for var in unit:
+                if bit_count[domains[var]] == 2:
+                    pair_cells.setdefault(domains[var], []).append(var)
+            for pair, cells in pair_cells.items():
+                if len(cells) > 2:
+                    return None  # three cells cannot share two values
+                if len(cells) == 2:
+                    for var in unit:
+                        if var not in cells and domains[var] & pair:
+                            solver.reduce_domain(var, domains[var] & ~pair)
+                            if not domains[var]:
+                                return None
+                            changed.append(var)
+
+            # only values with exactly two places can form a hidden pair
+            seen_once = seen_twice = seen_more = 0
+            for var in unit:
+                seen_more |= seen_twice & domains[var]
+                seen_twice |= seen_once & domains[var]
+                seen_once |= domains[var]
+            twice = seen_twice & ~seen_more
+            if bit_count[twice] < 2:
+                continue
+
+            places = {}  # value bit -> the unit cells that can take it
+            for var in unit:
+                mask = domains[var] & twice
+                while mask:
+                    low = mask & -mask
+                    places.setdefault(low, []).append(var)
+                    mask ^= low
+            owners = {}
+            for low, cells in places.items():
+                if len(cells) == 2:
+                    owners.setdefault(tuple(cells), []).append(low)
+            for cells, lows in owners.items():
+                if len(lows) == 2:
+                    pair = lows[0] | lows[1]
+                    for var in cells:
+                        if domains[var] & ~pair:
+                            solver.reduce_domain(var, domains[var] & pair)
+                            changed.append(var)
+        return changed
+
+
+# a value confined to the intersection of a box and a line within one of them can be
+# removed from the rest of the other (pointing: box -> line, claiming: line -> box)
+class PointingClaiming:
+    name = "pointing/claiming"
+
+    def groups_of(self, topology, var):
+        return topology.intersection_groups[var]
+
+    def propagate(self, solver, groups=None):
+        domains = solver.domains
+        bit_count = solver.bit_count
+        intersections = solver.topology.intersections
+        changed = []
+        for shared, line_rest, box_rest in (intersections if groups is None
+                                            else (intersections[i] for i in groups)):
+            shared_values = 0
+            for var in shared:
+                if bit_count[domains[var]] > 1:
+                    shared_values |= domains[var]
+            if not shared_values:
+                continue
+            line_values = box_values = 0
+            for var in line_rest:
+                line_values |= domains[var]
+            for var in box_rest:
+                box_values |= domains[var]
+
+            for values, rest in ((shared_values & ~box_values, line_rest),
+                                 (shared_values & ~line_values, box_rest)):
+                if not values:
+                    continue
+                for var in rest:
+                    if domains[var] & values:
+                        solver.reduce_domain(var, domains[var] & ~values)
+                        if not domains[var]:
+                            return None
+                        changed.append(var)
+        return changed
+
+
+# inference levels, each one adds a propagator to those of the level below
+AC3 = 0
+HIDDEN_SINGLES = 1
+PAIRS = 2
+POINTING_CLAIMING = 3
+INFERENCE_LEVELS = ("AC-3", "+ hidden singles", "+ naked/hidden pairs", "+ pointing/claiming")
+PROPAGATORS = (HiddenSingles(), Pairs(), PointingClaiming())
+
+
+# Counters for one solve. Stats from many solves can be summed with + or SolverStats.total(),
+# and a single solve's stats are truthy when it found a solution.
+class SolverStats:
+    COUNTERS = ("solves", "solved", "nodes", "backtracks", "revise_calls", "values_pruned",
+                "arcs_dequeued", "propagations", "propagation_ns", "search_ns", "cache_hits", "restarts",
+                "budget_exceeded", "cancelled")
+    MAXIMA = ("max_depth", "peak_trail")
+    __slots__ = COUNTERS + MAXIMA
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+        self.solves = 1
+
+    def __bool__(self):
+        return self.solves > 0 and self.solved == self.solves
+
+    def __add__(self, other):
+        total = SolverStats()
+        for name in self.COUNTERS:
+            setattr(total, name, getattr(self, name) + getattr(other, name))
+        for name in self.MAXIMA:
+            setattr(total, name, max(getattr(self, name), getattr(other, name)))
+        return total
+
+    @classmethod
+    def total(cls, stats):
+        total = cls()
+        total.solves = 0
+        for item in stats:
+            total = total + item
+        return total
+
+    @classmethod
+    def from_dict(cls, values):
+        stats = cls()
+        for name in cls.__slots__:
+            setattr(stats, name, values[name])
+        return stats
+
+    @property
+    def total_ns(self):
+        return self.propagation_ns + self.search_ns
+
+    # how a single solve ended: "solved", "cancelled", "budget exceeded" or "unsolvable" (the
+    # search ran to completion without finding a solution)
+    @property
+    def status(self):
+        if self:
+            return "solved"
+        if self.cancelled:
+            return "cancelled"
+        if self.budget_exceeded:
+            return "budget exceeded"
+        return "unsolvable"
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)}" for name in self.__slots__)
+        return f"SolverStats({fields})"
+
+
+# Limits on one solve, checked by the search before every node: search nodes, seconds of wall
+# time and propagation passes, plus a cancellation token (anything with is_set(), such as a
+# CancellationToken or a multiprocessing Event). A solve stopped by one of them is not solved and
+# has stats.cancelled or stats.budget_exceeded set, with the solver left at the state it reached.
+class Budget:
+    def __init__(self, max_nodes=None, timeout=None, max_propagations=None, cancel=None):
+        self.max_nodes = max_nodes
+        self.timeout = timeout
+        self.max_propagations = max_propagations
+        self.cancel = cancel
+        self.deadline = None  # perf_counter_ns() deadline of the running solve
+
+    def start(self):
+        self.deadline = None if self.timeout is None else perf_counter_ns() + int(self.timeout * 1e9)
+
+    # seconds left before the deadline, None without a timeout
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return max(0, self.deadline - perf_counter_ns()) / 1e9
+
+    # True, after recording why in `stats`, when the search has to stop
+    def exhausted(self, stats):
+        if self.cancel is not None and self.cancel.is_set():
+            stats.cancelled = 1
+        elif self.max_nodes is not None and stats.nodes >= self.max_nodes \
+                or self.max_propagations is not None and stats.propagations >= self.max_propagations \
+                or self.deadline is not None and perf_counter_ns() >= self.deadline:
+            stats.budget_exceeded = 1
+        else:
+            return False
+        return True
+
+
+# Cooperative cancellation of a solve running in another thread: cancel() makes its search stop
+# at the next node.
+class CancellationToken(threading.Event):
+    def cancel(self):
+        self.set()
+
+    @property
+    def cancelled(self):
+        return self.is_set()
+
+
+# The solution cache side of every engine's solve_iter(), the same for all of them. Without a
+# cache it just runs `solve`, the engine's own generator of steps, which fills solver.stats. With
+# one, a cached puzzle yields all its steps at once without solving, and a puzzle `solve` solves
+# is stored; the lookup's time counts as search time.
+def cached_solve_iter(solver, solve):
+    cache = solver.cache
+    if cache is None:
+        yield from solve()
+        return
+    start = perf_counter_ns()
+    given = [row[:] for row in solver.puzzle]
+    if cache.load(solver):
+        stats = solver.stats = SolverStats()
+        stats.solved = stats.cache_hits = 1
+        stats.search_ns = perf_counter_ns() - start
+        yield from solver.steps_queue
+        return
+    lookup_ns = perf_counter_ns() - start
+    yield from solve()
+    solver.stats.search_ns += lookup_ns
+    if solver.stats:
+        cache.put(given, solver.puzzle, solver.canonical)
+
+
+class SudokuSolverCSP:
+    def __init__(self, puzzle, inference=POINTING_CLAIMING, tracer=None, cache=None, seed=None, budget=None):
+        self.puzzle = puzzle  # n x n grid (9x9, 16x16, 25x25, ...) with 0 for empty cells
+        self.topology = get_topology(grid_box_size(puzzle))  # shared peers, units and arcs
+        self.bit_count = self.topology.bit_count  # domain size lookup
+        self.variables = self.topology.variables  # n * n variables, cell (r, c) is index r * n + c
+        self.domains = self.set_domains()  # bitmask domain of each variable (initially 1->n) if not assigned
+        self.arcs = self.topology.arcs  # all arcs between variables
+        self.steps_queue = []  # queue to store the steps of the solution
+        self.buckets = self.build_buckets()  # variables grouped by domain size, kept in sync by set_domain
+        self.trail = []  # (variable, previous domain) for every domain change, undone on backtrack
+        self.propagators = PROPAGATORS[:inference]  # extra inference run after AC-3
+        self.stats = SolverStats()  # counters of the last solve
+        self.tracer = tracer  # receives trace events when set, see sudoku_trace
+        self.cache = cache  # SolutionCache consulted before solving and filled after, see sudoku_cache
+        self.canonical = None  # canonical form of the puzzle, kept by the cache from load() to put()
+        # value order of the search: a private generator when seeded, the shared random module otherwise
+        self.random = random if seed is None else random.Random(seed)
+        self.budget = budget  # Budget limiting the solve, None for no limit
+
+    def set_domains(self):
+        n = self.topology.size
+        domains = [self.topology.all_values] * (n * n)
+        for r in range(n):
+            for c in range(n):
+                if self.puzzle[r][c] != 0:
+                    domains[r * n + c] = value_bit(self.puzzle[r][c])
+        return domains
+
+    def is_consistent(self, value, y):
+        if self.domains[y] & value_bit(value):
+            return self.bit_count[self.domains[y]] > 1
+        return True
+
+
+    # does the domain reduction if the value is not consistent
+    def revise(self, x, y):
+        # a value of x can only be inconsistent with y when y is down to that single value
+        self.stats.revise_calls += 1
+        domain_y = self.domains[y]
+        if self.bit_count[domain_y] != 1 or not self.domains[x] & domain_y:
+            return False
+
+        self.reduce_domain(x, self.domains[x] & ~domain_y)
+        return True
+
+
+    # buckets[k] holds the variables whose domain has k values: buckets[1] are the assigned ones,
+    # buckets[0] the wiped-out ones, and the lowest non-empty bucket above 1 gives the MRV variable
+    def build_buckets(self):
+        buckets = [set() for _ in range(self.topology.size + 1)]
+        for var, domain in enumerate(self.domains):
+            buckets[self.bit_count[domain]].add(var)
+        return buckets
+
+    # every domain change goes through here so that a failed branch can be undone from the trail
+    def set_domain(self, var, mask):
+        old_mask = self.domains[var]
+        self.trail.append((var, old_mask))
+        self.domains[var] = mask
+        self.buckets[self.bit_count[old_mask]].discard(var)
+        self.buckets[self.bit_count[mask]].add(var)
+
+    # narrow a domain during propagation, recording a step once it is down to a single value
+    def reduce_domain(self, var, mask):
+        removed = self.domains[var] & ~mask
+        self.stats.values_pruned += self.bit_count[removed]
+        if self.tracer is not None:
+            self.tracer.emit((REMOVE, var, removed))
+        self.set_domain(var, mask)
+        if self.bit_count[mask] == 1:  # Domain reduced to a single value
+            # Add the variable and its fixed value to the queue
+            self.steps_queue.append((self.cell(var), mask_value(mask)))
+
+    def checkpoint(self):
+        return len(self.trail), len(self.steps_queue)
+
+    # undo every domain change and step recorded since the checkpoint
+    def rollback(self, mark):
+        trail_size, steps_size = mark
+        trail = self.trail
+        domains = self.domains
+        buckets = self.buckets
+        bit_count = self.bit_count
+        while len(trail) > trail_size:
+            var, mask = trail.pop()
+            buckets[bit_count[domains[var]]].discard(var)
+            buckets[bit_count[mask]].add(var)
+            domains[var] = mask
+        del self.steps_queue[steps_size:]
+
+    # AC-3. With no argument every arc is checked (initial pass); given the variables whose
+    # domains just changed, only the arcs pointing at them are queued (incremental pass).
+    # revise(x, y) can only prune when y is a singleton, so arcs towards variables with more
+    # than one value are never queued; on a 25x25 grid that is most of them.
+    def apply_arc_consistency(self, changed=None):
+        domains = self.domains
+        bit_count = self.bit_count
+        peers = self.topology.peers
+        queue = deque((neighbor, x) for x in (self.variables if changed is None else changed)
+                      if bit_count[domains[x]] == 1 for neighbor in peers[x])
+        queued = set(queue)  # arcs currently waiting, so each one is queued at most once
+        dequeued = 0
+
+        while queue:
+            arc = queue.popleft()
+            queued.discard(arc)
+            dequeued += 1
+            x, y = arc
+            if self.revise(x, y):
+                if not domains[x]:
+                    self.stats.arcs_dequeued += dequeued
+                    return False  # No solution exists
+                if bit_count[domains[x]] != 1:
+                    continue
+
+                for neighbor in peers[x]:
+                    if neighbor != y and (neighbor, x) not in queued:
+                        queued.add((neighbor, x))
+                        queue.append((neighbor, x))
+
+        self.stats.arcs_dequeued += dequeued
+        return True
+
+    def propagate(self, changed=None):
+        self.stats.propagations += 1
+        start = perf_counter_ns()
+        consistent = self.propagate_to_fixpoint(changed)
+        self.stats.propagation_ns += perf_counter_ns() - start
+        return consistent
+
+    # AC-3 followed by the propagators of the inference level, repeated until none of them
+    # removes anything more. Like AC-3, the propagators only look again at the groups of cells
+    # whose domains changed, found from the trail: the state before an incremental pass was
+    # already a fixpoint everywhere else.
+    def propagate_to_fixpoint(self, changed=None):
+        tracer = self.tracer
+        trail = self.trail
+        propagators = self.propagators
+        if tracer is not None:
+            tracer.emit((PROPAGATE, "AC-3", len(self.variables) if changed is None else len(changed)))
+        mark = len(trail)
+        if not self.apply_arc_consistency(changed):
+            return False
+        # group indices each propagator still has to look at, None for all of them
+        if changed is None:
+            pending = [None] * len(propagators)
+        else:
+            pending = [set() for _ in propagators]
+            self.mark_pending(pending, changed)
+        while True:
+            self.mark_pending(pending, [var for var, _ in trail[mark:]])
+            mark = len(trail)
+            for i, propagator in enumerate(propagators):
+                groups = pending[i]
+                if groups is not None and not groups:
+                    continue
+                pending[i] = set()
+                changed = propagator.propagate(self, groups)
+                if tracer is not None:
+                    tracer.emit((PROPAGATE, propagator.name, None if changed is None else len(changed)))
+                if changed is None:
+                    return False
+                if changed:
+                    break
+            else:
+                return True
+            if tracer is not None:
+                tracer.emit((PROPAGATE, "AC-3", len(changed)))
+            if not self.apply_arc_consistency(changed):
+                return False
+
+    # adds the groups of the `changed` variables to every propagator's pending set
+    def mark_pending(self, pending, changed):
+        topology = self.topology
+        for propagator, groups in zip(self.propagators, pending):
+            if groups is not None:
+                for var in changed:
+                    groups.update(propagator.groups_of(topology, var))
+
+    # (row, column) of a variable index
+    def cell(self, var):
+        return self.topology.cells[var]
+
+    # get all neighbors of a cell (row, column, box)
+    def get_neighbors(self, var):
+        return self.topology.peers[var]
+
+
+    # grid of the values fixed so far, 0 elsewhere: the solution once solved, and the state the
+    # search had reached when a budget or cancellation stopped it
+    def current_grid(self):
+        n = self.topology.size
+        values = [mask_value(domain) if self.bit_count[domain] == 1 else 0 for domain in self.domains]
+        return [values[r * n:r * n + n] for r in range(n)]
+
+    def fill_puzzle(self):
+        for var, domain in enumerate(self.domains):
+            r, c = self.cell(var)
+            self.puzzle[r][c] = mask_value(domain)
+
+    # returns the SolverStats of this solve, truthy when a solution was found
+    def solve(self):
+        for _ in self.solve_iter():
+            pass
+        return self.stats
+
+    # Solves the puzzle, yielding ((r, c), value) steps in steps_queue order as soon as they are
+    # committed. Steps found by the initial propagation can never be undone and are yielded
+    # right away, unless that propagation already hit a contradiction, in which case nothing
+    # is yielded; steps found during search are held back until the search reaches a solution,
+    # and dropped from steps_queue when it does not (current_grid() still shows where it got to).
+    # self.stats is filled in once the generator is exhausted. With a cache, a cached puzzle
+    # yields all its steps at once without solving (see cached_solve_iter).
+    def solve_iter(self):
+        return cached_solve_iter(self, self.solve_steps)
+
+    def solve_steps(self):
+        stats = self.stats = SolverStats()
+        if self.budget is not None:
+            self.budget.start()
+        start = perf_counter_ns()
+        consistent = self.propagate()
+        stats.search_ns = perf_counter_ns() - start  # time outside propagation is settled below
+        committed = len(self.steps_queue)
+        if consistent:
+            # a contradiction means some of these steps are wrong, so none are shown
+            yield from self.steps_queue[:committed]
+
+        start = perf_counter_ns()
+        stats.solved = int(consistent and self.backtrack())
+        if stats.solved:
+            self.fill_rest_of_steps()
+            self.fill_puzzle()
+        stats.search_ns += perf_counter_ns() - start - stats.propagation_ns
+        stats.peak_trail = max(stats.peak_trail, len(self.trail))
+        if stats.solved:
+            yield from self.steps_queue[committed:]
+        else:
+            # a budget may have stopped the search with guesses still open; they are not steps
+            del self.steps_queue[committed:]
+
+    # Number of solutions of the puzzle, stopping as soon as `limit` have been found. The search
+    # resumes from the state each solution left behind instead of starting over.
+    def count_solutions(self, limit=2):
+        stats = self.stats = SolverStats()
+        if self.budget is not None:
+            self.budget.start()
+        start = perf_counter_ns()
+        found = 0
+        if self.propagate():
+            for _ in self.search():
+                found += 1
+                if found >= limit:
+                    break
+        stats.solved = int(found > 0)
+        stats.search_ns = perf_counter_ns() - start - stats.propagation_ns
+        return found
+
+    # Select unassigned variable with minimum remaining values
+    def select_unassigned_variable(self):
+        for size in range(2, self.topology.size + 1):
+            if self.buckets[size]:
+                return next(iter(self.buckets[size]))
+        return None
+
+    def backtrack(self):
+        return next(self.search(), False)
+
+    # Depth-first search over an explicit stack of decisions instead of recursion. Yields each
+    # time every variable is assigned, leaving the solution in self.domains; resuming it carries
+    # on from that state to the next solution.
+    def search(self):
+        buckets = self.buckets
+        stats = self.stats
+        budget = self.budget
+        stack = []  # (variable, values left to try, checkpoint before its first value) per decision
+
+        while True:
+            if not buckets[0]:
+                # solution found
+                if len(buckets[1]) == len(self.variables):
+                    yield True
+                else:
+                    var = self.select_unassigned_variable()
+                    # Shuffle the values to be assigned to the variable to generate random solutions if multiple solutions exist
+                    to_be_shuffled_values = mask_values(self.domains[var])
+                    self.random.shuffle(to_be_shuffled_values)
+                    stack.append((var, to_be_shuffled_values, self.checkpoint()))
+                    if len(stack) > stats.max_depth:
+                        stats.max_depth = len(stack)
+                    if len(self.trail) > stats.peak_trail:
+                        stats.peak_trail = len(self.trail)
+
+            # try the next value of the innermost open decision, backing up while decisions are exhausted
+            while True:
+                if not stack:
+                    return
+                var, values, mark = stack[-1]
+                self.rollback(mark)
+                if not values:
+                    stack.pop()
+                    stats.backtracks += 1
+                    if self.tracer is not None:
+                        self.tracer.emit((BACKTRACK, var, len(stack)))
+                    continue
+                if budget is not None and budget.exhausted(stats):
+                    return
+                stats.nodes += 1
+                value = values.pop()
+                if self.tracer is not None:
+                    self.tracer.emit((ASSIGN, var, value, len(stack)))
+                self.set_domain(var, value_bit(value))
+                if self.propagate([var]):
+                    break
+
+    def display_steps(self):
+        print("Steps to solve the Sudoku:")
+        for step in self.steps_queue:
+            print(f"Set position {step[0]} to {step[1]}")
+
+    def fill_rest_of_steps(self):
+        steps_set = set()
+        for i in range(len(self.steps_queue)):
+            steps_set.add(self.steps_queue[i][0])
+
+        n = self.topology.size
+        for r in range(n):
+            for c in range(n):
+                if (r, c) not in steps_set and self.puzzle[r][c] == 0:
+                    self.steps_queue.append(((r, c), mask_value(self.domains[r * n + c])))
+                    steps_set.add((r, c))
+
+# solving engines selectable by name: "csp" (this module), "dlx" (sudoku_dlx) and "portfolio"
+# (sudoku_portfolio, racing several of them in separate processes)
+STRATEGIES = ("csp", "dlx", "portfolio")
+
+
+def make_solver(puzzle, strategy="csp", cache=None, budget=None):
+    if strategy == "csp":
+        return SudokuSolverCSP(puzzle, cache=cache, budget=budget)
+    if strategy == "dlx":
+        from sudoku_dlx import SudokuSolverDLX
+
+        return SudokuSolverDLX(puzzle, cache=cache, budget=budget)
+    if strategy == "portfolio":
+        from sudoku_portfolio import SudokuSolverPortfolio
+
+        return SudokuSolverPortfolio(puzzle, cache=cache, budget=budget)
+    raise ValueError(f"unknown strategy {strategy!r}, expected one of {', '.join(STRATEGIES)}")
+
+
+# Random puzzle with a unique solution. Clues are removed from a random full grid one at a
+# time in random order, and a removal is kept only while the solution stays unique, until
+# `clues` givens are left or no further clue can go. A single pass rarely gets below 23 givens
+# on a 9x9 grid; with `time_limit` (seconds), passes with new removal orders are retried until
+# one reaches `clues` or the time is up, keeping the sparsest. Returns the puzzle and its solution.
+def generate_puzzle(clues, box_size=3, time_limit=None):
+    n = box_size * box_size
+    solution = [[0] * n for _ in range(n)]
+    SudokuSolverCSP(solution).solve()
+    deadline = None if time_limit is None else perf_counter_ns() + int(time_limit * 1e9)
+
+    best, best_filled = None, n * n + 1
+    while True:
+        puzzle, filled = remove_clues(solution, clues)
+        if filled < best_filled:
+            best, best_filled = puzzle, filled
+        if best_filled <= clues or deadline is None or perf_counter_ns() >= deadline:
+            return best, solution
+
+
+# one greedy pass of generate_puzzle(): (puzzle, givens left)
+def remove_clues(solution, clues):
+    n = len(solution)
+    puzzle = [row[:] for row in solution]
+    filled = n * n
+    cells = list(range(n * n))
+    random.shuffle(cells)
+    for var in cells:
+        if filled <= clues:
+            break
+        r, c = divmod(var, n)
+        value = puzzle[r][c]
+        puzzle[r][c] = 0
+        if SudokuSolverCSP(puzzle).count_solutions(limit=2) == 1:
+            filled -= 1
+        else:
+            puzzle[r][c] = value
+    return puzzle, filled
+
+
+# search nodes needed to solve the puzzle at each inference level
+def inference_report(puzzle):
+    report = []
+    for level, name in enumerate(INFERENCE_LEVELS):
+        stats = SudokuSolverCSP([row[:] for row in puzzle], inference=level).solve()
+        report.append((name, stats.nodes, stats.solved))
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+
+    from sudoku_batch import main
+
+    sys.exit(main())
@@ -0,0 +1,74 @@
+from collections import deque
+
+# Trace events are plain tuples whose first item is the kind:
+#   (REMOVE, var, removed_mask)          values removed from a domain during propagation
+#   (ASSIGN, var, value, depth)          a value tried by the search
+#   (BACKTRACK, var, depth)              every value of a decision failed
+#   (PROPAGATE, source, count)           one propagation round: AC-3 with the number of seed
+#                                        variables, or a propagator with the number it changed
+#                                        (None when it found a contradiction)
+REMOVE = "remove"
+ASSIGN = "assign"
+BACKTRACK = "backtrack"
+PROPAGATE = "propagate"
+
+
+# Fans events out to several sinks. A solver only needs an object with emit(event),
+# so a single sink can also be passed directly.
+class Tracer:
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def emit(self, event):
+        for sink in self.sinks:
+            sink.emit(event)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# keeps the last `capacity` events in memory
+class RingBufferSink:
+    def __init__(self, capacity=10000):
+        self.events = deque(maxlen=capacity)
+
+    def emit(self, event):
+        self.events.append(event)
+
+    def close(self):
+        pass
+
+
+# appends one JSON array per event to a file
+class JsonLinesSink:
+    def __init__(self, path):
+        import json  # imported here so that importing the solver does not pay for it
+
+        self.dumps = json.dumps
+        self.file = open(path, "a", encoding="utf-8")
+
+    def emit(self, event):
+        self.file.write(self.dumps(event))
+        self.file.write("\n")
+
+    def close(self):
+        self.file.close()
+
+
+# hands every event to a function
+class CallbackSink:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def emit(self, event):
+        self.callback(event)
+
+    def close(self):
+        pass
@@ -0,0 +1,44 @@
+from sudoku_board import Board
+from sudoku_solver import value_bit
+
+
+# Incremental validation of a board being typed in. The Board keeps the digits present in every
+# row, column and box up to date, so placing or clearing one cell and checking it against its
+# peers costs O(peers) instead of re-running AC-3 over the whole board.
+class LiveValidator:
+    def __init__(self, board=None):
+        self.board = Board() if board is None else board.copy()
+        self.topology = self.board.topology
+
+    @property
+    def filled(self):
+        return self.board.filled
+
+    # bitmask of the values still possible for a cell
+    def candidates(self, row, col):
+        value = self.board[row, col]
+        return value_bit(value) if value else self.board.candidates(row, col)
+
+    # Cells that placing `value` at (row, col) would break: peers already holding the value, and
+    # empty peers that would be left without any candidate. Nothing is changed.
+    def conflicts(self, row, col, value):
+        bit = value_bit(value)
+        cells = self.board.cells
+        conflicts = []
+        for peer in self.topology.peers[row * self.topology.size + col]:
+            if cells[peer] == value:
+                conflicts.append(self.topology.cells[peer])
+            elif not cells[peer] and self.board.candidates(*self.topology.cells[peer]) == bit:
+                conflicts.append(self.topology.cells[peer])
+        return conflicts
+
+    # Places `value` at (row, col), replacing whatever was there, and returns the conflicts it
+    # causes (see conflicts()). The value is kept either way so the caller can retract it.
+    def place(self, row, col, value):
+        self.clear(row, col)
+        conflicts = self.conflicts(row, col, value)
+        self.board[row, col] = value
+        return conflicts
+
+    def clear(self, row, col):
+        self.board[row, col] = 0